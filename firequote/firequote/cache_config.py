@@ -0,0 +1,53 @@
+"""
+firequote/cache_config.py
+-------------------------
+Environment-driven cache configuration.
+
+    FIREQUOTE_CACHE_URL       locmem:// (default), file:///path/to/dir,
+                              redis://host:6379/0 (or rediss://), dummy://
+    FIREQUOTE_CACHE_TIMEOUT   default timeout in seconds (default 300)
+
+locmem:// lives in each process, so a cache.delete() is not seen by the
+other workers; with it, version stamps are read from the database instead
+of the cache (see is_shared).
+"""
+
+import os
+from urllib.parse import urlparse
+
+BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "dummy": "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def build_cache(url):
+    parsed = urlparse(url)
+    if parsed.scheme not in BACKENDS:
+        raise ValueError(f"Unsupported cache backend in FIREQUOTE_CACHE_URL: {url!r}")
+
+    config = {
+        "BACKEND": BACKENDS[parsed.scheme],
+        "TIMEOUT": int(os.environ.get("FIREQUOTE_CACHE_TIMEOUT", 300)),
+        "KEY_PREFIX": "firequote",
+    }
+    if parsed.scheme == "locmem":
+        config["LOCATION"] = parsed.netloc or "firequote"
+    elif parsed.scheme == "file":
+        config["LOCATION"] = parsed.path
+    elif parsed.scheme in ("redis", "rediss"):
+        # Redis-compatible servers (Redis, Valkey, KeyDB...) take the URL as is
+        config["LOCATION"] = url
+    return config
+
+
+def is_shared(config):
+    # True if every process sees the same entries (and the same deletions)
+    return config["BACKEND"] != BACKENDS["locmem"]
+
+
+def build_caches():
+    return {"default": build_cache(os.environ.get("FIREQUOTE_CACHE_URL", "locmem://"))}
@@ -0,0 +1,86 @@
+"""
+firequote/db_config.py
+----------------------
+Environment-driven database configuration.
+
+Every setting has a FIREQUOTE_DB_* environment variable, falling back to the
+local development database. Supports persistent connections with health
+checks, psycopg 3's built-in connection pool (Django 5.1+) and an optional
+read replica.
+
+    FIREQUOTE_DB_NAME / _USER / _PASSWORD / _HOST / _PORT
+    FIREQUOTE_DB_CONN_MAX_AGE      seconds to keep a connection open (default 60)
+    FIREQUOTE_DB_HEALTH_CHECKS     check persistent connections before reuse (default on)
+    FIREQUOTE_DB_POOL              enable the psycopg pool (default off)
+    FIREQUOTE_DB_POOL_MIN_SIZE / _MAX_SIZE / _TIMEOUT
+    FIREQUOTE_DB_REPLICA_HOST      enables the "replica" alias for read-only requests
+    FIREQUOTE_DB_REPLICA_PORT / _NAME / _USER / _PASSWORD (default to the primary's)
+    FIREQUOTE_DB_REPLICA_PIN_SECONDS  keep reading from the primary after a write (default 5)
+"""
+
+import os
+
+
+def env(name, default=None):
+    return os.environ.get(f"FIREQUOTE_DB_{name}", default)
+
+
+def env_bool(name, default=False):
+    value = env(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name, default):
+    value = env(name)
+    return int(value) if value not in (None, "") else default
+
+
+def pool_options():
+    # psycopg_pool.ConnectionPool arguments, see
+    # https://docs.djangoproject.com/en/5.2/ref/databases/#connection-pool
+    return {
+        "min_size": env_int("POOL_MIN_SIZE", 2),
+        "max_size": env_int("POOL_MAX_SIZE", 10),
+        "timeout": env_int("POOL_TIMEOUT", 10),
+    }
+
+
+def build_database(prefix=""):
+    # Build one DATABASES entry; `prefix` selects e.g. the REPLICA_* variables
+    config = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env(f"{prefix}NAME") or env("NAME", "firequote_db"),
+        "USER": env(f"{prefix}USER") or env("USER", "firequote_user"),
+        "PASSWORD": env(f"{prefix}PASSWORD") or env("PASSWORD", "admin"),
+        "HOST": env(f"{prefix}HOST") or env("HOST", "localhost"),
+        "PORT": env(f"{prefix}PORT") or env("PORT", "5432"),
+        "OPTIONS": {},
+    }
+
+    if env_bool("POOL"):
+        # The pool manages connection reuse itself; Django refuses to combine
+        # it with persistent connections, so CONN_MAX_AGE must stay at 0.
+        config["OPTIONS"]["pool"] = pool_options()
+        config["CONN_MAX_AGE"] = 0
+    else:
+        config["CONN_MAX_AGE"] = env_int("CONN_MAX_AGE", 60)
+        config["CONN_HEALTH_CHECKS"] = env_bool("HEALTH_CHECKS", True)
+
+    return config
+
+
+def build_databases():
+    databases = {"default": build_database()}
+    if env("REPLICA_HOST"):
+        databases["replica"] = build_database("REPLICA_")
+        # Tests run against the primary only
+        databases["replica"]["TEST"] = {"MIRROR": "default"}
+    return databases
+
+
+def build_routers(databases):
+    if "replica" in databases:
+        return ["firequote.db_router.ReplicaRouter"]
+    return []
@@ -0,0 +1,61 @@
+"""
+firequote/db_router.py
+----------------------
+Sends the reads of read-only requests (GET/HEAD/OPTIONS: listings, dashboards,
+detail pages) to the "replica" database. Requests that write (POST and
+friends) read from the primary, and so does the same browser for a few
+seconds afterwards (e.g. the redirect to quote_details after quote_form),
+so users always see their own changes despite replication lag. Reads made
+inside a transaction also go to the primary, as the replica cannot see what
+the transaction has written yet.
+"""
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_ONLY_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Cookie marking a browser that wrote recently and must keep reading from the primary
+PIN_COOKIE = "fq_primary"
+
+# True while the current request (thread or async task) may read from the replica
+use_replica = ContextVar("use_replica", default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return "replica"
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaRoutingMiddleware:
+    # Flags read-only requests so ReplicaRouter sends their reads to the replica.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        read_only = request.method in READ_ONLY_METHODS
+        token = use_replica.set(read_only and PIN_COOKIE not in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+        if not read_only:
+            pin_seconds = getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5)
+            response.set_cookie(PIN_COOKIE, "1", max_age=pin_seconds, httponly=True, samesite="Lax")
+        return response
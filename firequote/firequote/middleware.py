@@ -0,0 +1,76 @@
+"""
+firequote/middleware.py
+-----------------------
+Response compression: Brotli when the browser accepts it and the optional
+`brotli` package is installed, GZip otherwise.
+
+Pages that embed a CSRF token (forms) are never Brotli-compressed: against
+BREACH they go through Django's GZip, which pads each response with random
+bytes, on top of the per-response masking of the token itself.
+"""
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional dependency, GZip still applies
+    brotli = None
+
+# Already-compressed payloads (generated .docx files are zip archives)
+SKIP_CONTENT_TYPES = (
+    "application/vnd.openxmlformats",
+    "application/zip",
+    "image/",
+)
+
+MIN_SIZE = 200
+
+
+def accepts_brotli(accept_encoding):
+    # True if "br" (or "*") is accepted with a non-zero q-value
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted.get("br", accepted.get("*", 0.0)) > 0
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        content_type = response.get("Content-Type", "")
+        if content_type.startswith(SKIP_CONTENT_TYPES):
+            return response
+
+        if (
+            brotli is None
+            or response.streaming
+            or request.META.get("CSRF_COOKIE_NEEDS_UPDATE")  # The page embeds a CSRF token
+            or not accepts_brotli(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        if response.has_header("Content-Encoding") or len(response.content) < MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=5)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        response.headers["Content-Encoding"] = "br"
+        # The compressed body is no longer byte-identical to the original
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        return response
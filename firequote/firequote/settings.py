@@ -13,6 +13,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from .cache_config import build_caches, is_shared
+from .db_config import build_databases, build_routers, env_int
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'quotes',
 ]
 
@@ -49,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'quotes.tenants.TenantMiddleware',
 ]
 
 ROOT_URLCONF = 'firequote.urls'
@@ -74,16 +79,25 @@ WSGI_APPLICATION = 'firequote.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'firequote_db',          # Nombre exacto de tu base de datos
-        'USER': 'firequote_user',        # O el usuario que creaste (ej. firequote_admin)
-        'PASSWORD': 'admin',             # La contraseña que le diste
-        'HOST': 'localhost',             # O IP del servidor
-        'PORT': '5432',                  # Puerto estándar de PostgreSQL
-    }
-}
+# Connection settings come from FIREQUOTE_DB_* environment variables, see db_config.py
+DATABASES = build_databases()
+
+DATABASE_ROUTERS = build_routers(DATABASES)
+
+DATABASE_REPLICA_PIN_SECONDS = env_int('REPLICA_PIN_SECONDS', 5)
+
+if DATABASE_ROUTERS:
+    MIDDLEWARE.insert(0, 'firequote.db_router.ReplicaRoutingMiddleware')
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Backend comes from the FIREQUOTE_CACHE_URL environment variable, see cache_config.py
+CACHES = build_caches()
+
+# Whether cache invalidations reach every worker; if not, version stamps
+# (norm catalog, rate table) are computed from the database on each use
+FIREQUOTE_SHARED_CACHE = is_shared(CACHES['default'])
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -130,3 +144,20 @@ import os
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Generated documents (quotes/archive.py); any Django storage backend works
+    'archive': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': os.path.join(MEDIA_ROOT, 'archive')},
+    },
+}
+
+# Archive retention, applied by `manage.py compact_archive`
+FIREQUOTE_ARCHIVE_RETENTION_DAYS = int(os.environ.get('FIREQUOTE_ARCHIVE_RETENTION_DAYS', 180))
+FIREQUOTE_ARCHIVE_KEEP_VERSIONS = int(os.environ.get('FIREQUOTE_ARCHIVE_KEEP_VERSIONS', 3))
+
+# Tenant (office) served when the request host matches no Tenant.domain; see quotes/tenants.py
+FIREQUOTE_DEFAULT_TENANT = os.environ.get('FIREQUOTE_DEFAULT_TENANT', 'default')
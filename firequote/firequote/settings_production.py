@@ -0,0 +1,74 @@
+"""
+Production settings profile for firequote.
+
+Usage:
+    DJANGO_SETTINGS_MODULE=firequote.settings_production
+    python manage.py collectstatic --noinput
+
+Reads the following environment variables on top of the FIREQUOTE_DB_* and
+FIREQUOTE_CACHE_* ones used by the base settings:
+
+    FIREQUOTE_SECRET_KEY      required
+    FIREQUOTE_ALLOWED_HOSTS   comma separated, e.g. "firequote.local,10.0.0.5"
+    FIREQUOTE_STATIC_ROOT     collectstatic target (default BASE_DIR/staticfiles)
+    FIREQUOTE_HTTPS           "1" when served over HTTPS (secure cookies)
+
+Static files are stored with hashed names (ManifestStaticFilesStorage) so they
+can be cached forever. When the optional `whitenoise` package is installed
+the app serves them itself, pre-compressed; otherwise the reverse proxy must
+serve STATIC_ROOT at STATIC_URL with far-future cache headers.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE, STORAGES, TEMPLATES
+
+SECRET_KEY = os.environ["FIREQUOTE_SECRET_KEY"]
+
+DEBUG = False
+
+ALLOWED_HOSTS = [h.strip() for h in os.environ.get("FIREQUOTE_ALLOWED_HOSTS", "").split(",") if h.strip()]
+
+
+# Templates: compile each template once per process
+
+TEMPLATES[0]["APP_DIRS"] = False
+TEMPLATES[0]["OPTIONS"]["loaders"] = [
+    (
+        "django.template.loaders.cached.Loader",
+        [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+    ),
+]
+
+
+# Compressed responses (Brotli when available, GZip otherwise)
+
+_security_index = MIDDLEWARE.index("django.middleware.security.SecurityMiddleware")
+MIDDLEWARE.insert(_security_index + 1, "firequote.middleware.CompressionMiddleware")
+
+
+# Static files: hashed names, far-future caching
+
+STATIC_URL = "/static/"
+STATIC_ROOT = os.environ.get("FIREQUOTE_STATIC_ROOT", os.path.join(BASE_DIR, "staticfiles"))
+
+try:
+    import whitenoise  # noqa: F401
+except ImportError:
+    STATICFILES_BACKEND = "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"
+else:
+    STATICFILES_BACKEND = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+    # Serve static files before any other middleware touches the request
+    MIDDLEWARE.insert(_security_index + 1, "whitenoise.middleware.WhiteNoiseMiddleware")
+
+STORAGES["staticfiles"] = {"BACKEND": STATICFILES_BACKEND}
+
+
+# Security
+
+SESSION_COOKIE_SECURE = os.environ.get("FIREQUOTE_HTTPS", "0") == "1"
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
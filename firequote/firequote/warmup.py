@@ -0,0 +1,97 @@
+"""
+firequote/warmup.py
+-------------------
+Warm-up of a freshly started worker process, so that its first quote is
+served at steady-state latency instead of paying for lazy imports, template
+compilation and cache loading. Called from gunicorn.conf.py (post_worker_init).
+
+Heavy modules stay out of module-level imports (manage.py commands and the
+master process never pay for them); only workers load them here, once.
+Check with `python manage.py import_budget`.
+"""
+
+import importlib
+import logging
+import os
+import time
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Pages rendered by the quote workflow
+HTML_TEMPLATES = ("quotes/quote_form.html", "quotes/quote_details.html", "quotes/quote_search.html")
+
+
+def is_template_file(path):
+    # .docx templates only: skips Word lock files (~$name.docx) and anything not a zip
+    name = os.path.basename(path)
+    return name.endswith(".docx") and not name.startswith("~$") and zipfile.is_zipfile(path)
+
+
+def compile_templates(docx_engine, sources):
+    # Compile every .docx template; returns (templates needing docxtpl, templates that failed)
+    fallback, failed = [], []
+    for namespace, directory in sources:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not is_template_file(path):
+                continue
+            try:
+                compiled = docx_engine.get_compiled(path, namespace)
+            except Exception:
+                logger.warning("Could not compile template %s", path, exc_info=True)
+                failed.append(os.path.join(namespace, name))
+                continue
+            if compiled is None:
+                fallback.append(os.path.join(namespace, name))
+    return fallback, failed
+
+
+def warm_up():
+    from django.db import connections
+
+    start = time.perf_counter()
+    fallback, failed = [], []
+    try:
+        from django.template.loader import get_template
+        from django.urls import get_resolver
+
+        # URLconf, views, services and API (normally imported by the first request)
+        get_resolver().url_patterns
+
+        from quotes import docx_engine, item_library, norm_catalog, pricing, services, tenants
+
+        tenant_list = list(tenants.get_registry().by_id.values())
+
+        for name in HTML_TEMPLATES:
+            get_template(name)
+
+        # Process-local data: norm catalogs, rate table, item suggestions
+        for tenant in tenant_list:
+            norm_catalog.get_norms(tenant.id)
+        pricing.get_rate_table()
+        item_library.get_index()
+
+        # Compiled .docx templates, shared and per tenant (templates_docs/<slug>/);
+        # a broken template is logged and left for the first request. docxtpl
+        # is imported only if a template needs the fallback.
+        sources = [("", services.TEMPLATES_DOCS_DIR)] + [
+            (t.slug, os.path.join(services.TEMPLATES_DOCS_DIR, t.slug)) for t in tenant_list
+        ]
+        fallback, failed = compile_templates(docx_engine, sources)
+        if fallback:
+            importlib.import_module("docxtpl")  # Imported for its side effect: loaded before the first request
+    except Exception:
+        logger.exception("Worker warm-up failed; caches will be filled on first use")
+        return
+    finally:
+        # Request threads open their own connections
+        connections.close_all()
+
+    logger.info(
+        "Worker %s warmed up in %.0f ms (docxtpl fallback: %s; failed templates: %s)",
+        os.getpid(), (time.perf_counter() - start) * 1000,
+        ", ".join(fallback) or "none", ", ".join(failed) or "none",
+    )
@@ -0,0 +1,23 @@
+# gunicorn.conf.py
+# Production server: gunicorn (run from this directory, picks up this file)
+#
+#   DJANGO_SETTINGS_MODULE=firequote.settings_production gunicorn
+#
+import multiprocessing
+import os
+
+wsgi_app = "firequote.wsgi:application"
+bind = os.environ.get("FIREQUOTE_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("FIREQUOTE_THREADS", 1))
+timeout = 60
+
+# Import Django and the project once in the master; workers are forked with it
+preload_app = True
+
+
+def post_worker_init(worker):
+    # Fill the per-process caches before the worker accepts requests
+    from firequote.warmup import warm_up
+
+    warm_up()
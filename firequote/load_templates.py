@@ -6,6 +6,7 @@ django.setup()
 
 from django.core.files import File
 from quotes.models import TemplateDoc
+from quotes.tenants import get_default_tenant
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 templates_dir = os.path.join(BASE_DIR, "quotes", "templates_docs")
@@ -23,14 +24,15 @@ def infer_tags_from_name(fname):
     return services_tag, formats_tag
 
 def main():
-    files = [f for f in os.listdir(templates_dir) if f.lower().endswith(".docx")]
+    files = [f for f in os.listdir(templates_dir) if f.lower().endswith(".docx") and not f.startswith("~$")]
+    tenant = get_default_tenant()  # Shared templates are registered under the default office
     print(f"Found {len(files)} templates in {templates_dir}")
     for f in files:
         fullpath = os.path.join(templates_dir, f)
         services_tag, formats_tag = infer_tags_from_name(f)
         name = f  # puedes usar el mismo nombre como display name
         # Busca registro existente por name
-        obj = TemplateDoc.objects.filter(name=name).first()
+        obj = TemplateDoc.objects.for_tenant(tenant).filter(name=name).first()
         if obj:
             print(f"Updating {name} (services={services_tag}, formats={formats_tag})")
             # reemplazar archivo
@@ -45,6 +47,7 @@ def main():
             with open(fullpath, "rb") as fp:
                 django_file = File(fp)
                 obj = TemplateDoc.objects.create(
+                    tenant=tenant,
                     name=name,
                     file=None,
                     services_tag=services_tag,
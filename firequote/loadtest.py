@@ -0,0 +1,372 @@
+# loadtest.py
+"""
+Load test of the quote workflow against a LOCAL FireQuote instance.
+
+Each simulated user loops over realistic sessions:
+
+    GET  /                     form page (CSRF cookie + token, client list)
+    POST /                     new quote, with an existing client or a new one,
+                               and a random service/format combination (all
+                               21 templates are covered)
+    GET  /quote/<id>/          details page (norm list)
+    POST /quote/<id>/          random items, notes and norms -> generated .docx
+    GET  /quote/<id>/download/ archived document
+
+Concurrency is ramped in stages and each stage reports throughput, latency
+percentiles and error rate per step, so capacity changes between releases
+show up as numbers. Only the standard library is used.
+
+Setup (a throwaway database, never production data):
+
+    python manage.py migrate
+    python manage.py loaddata quotes_data.json
+    gunicorn firequote.wsgi -w 4        (or: python manage.py runserver --noreload)
+
+quotes_data.json (in this directory) holds the clients, norms and Word
+template records of the default office; without it sessions still run, but
+create every client themselves and select no norms.
+
+    python loadtest.py --stages 1,5,10,20 --stage-duration 30 --output results.json
+
+Every session creates a quote (and sometimes a client), so reseed between runs
+that should be compared.
+"""
+
+import argparse
+import http.client
+import ipaddress
+import itertools
+import json
+import math
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+SERVICES = ("is_detection", "is_protection", "is_human_safety")
+FORMATS = (("deliver_autocad",), ("deliver_revit",), ("deliver_autocad", "deliver_revit"))
+
+# 7 service combinations x 3 delivery formats = the 21 templates
+COMBINATIONS = [
+    services + formats
+    for n in range(1, len(SERVICES) + 1)
+    for services in itertools.combinations(SERVICES, n)
+    for formats in FORMATS
+]
+
+STEPS = ("form", "create", "details", "generate", "download")
+
+# Values of quotes.models.TITLE_CHOICES (this script does not import Django)
+CLIENT_TITLES = ("ingeniero", "ingeniera", "arquitecto", "arquitecta", "senior", "seniora")
+
+CSRF_TOKEN_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+CLIENT_OPTION_RE = re.compile(r'<option value="(\d+)">')
+NORM_RE = re.compile(r'name="selected_norms" value="(\d+)"')
+QUOTE_URL_RE = re.compile(r"/quote/(\d+)/$")
+
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+SAMPLE_ITEMS = [
+    "Revisión de planos arquitectónicos",
+    "Memoria de cálculo hidráulico",
+    "Ubicación de detectores de humo",
+    "Cálculo de rutas de evacuación",
+    "Diseño del cuarto de bombas",
+    "Señalización de salidas de emergencia",
+    "Red de rociadores automáticos",
+    "Panel de control de alarma",
+]
+
+
+class StepError(Exception):
+    pass
+
+
+class Session:
+    # One browser: a keep-alive connection and its cookies
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.netloc
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        self.cookies = {}
+
+    def close(self):
+        self.connection.close()
+
+    def request(self, method, path, fields=None):
+        headers = {"Host": self.host, "User-Agent": "firequote-loadtest"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        body = None
+        if fields is not None:
+            body = urlencode(fields, doseq=True)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["Referer"] = f"http://{self.host}{path}"
+
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()  # reopened by the next request
+            raise
+
+        for header in response.headers.get_all("Set-Cookie") or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response, content
+
+
+class Runner:
+    def __init__(self, options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.latencies = defaultdict(list)  # step -> seconds
+        self.errors = defaultdict(int)  # step -> count
+        self.error_samples = []
+        self.sessions = 0
+
+    def record(self, step, elapsed, error=None):
+        with self.lock:
+            if error is None:
+                self.latencies[step].append(elapsed)
+            else:
+                self.errors[step] += 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(f"{step}: {error}")
+
+    def timed(self, session, step, method, path, fields=None, expect=200):
+        start = time.perf_counter()
+        try:
+            response, content = session.request(method, path, fields)
+        except (OSError, http.client.HTTPException) as exc:
+            self.record(step, time.perf_counter() - start, f"{type(exc).__name__}: {exc}")
+            raise StepError from exc
+
+        elapsed = time.perf_counter() - start
+        if response.status != expect:
+            self.record(step, elapsed, f"HTTP {response.status} for {method} {path}")
+            raise StepError
+        self.record(step, elapsed)
+        return response, content
+
+    def run_session(self, session):
+        response, content = self.timed(session, "form", "GET", "/")
+        page = content.decode("utf-8", "replace")
+        token = CSRF_TOKEN_RE.search(page)
+        if token is None:
+            self.record("form", 0, "no CSRF token in the form page")
+            raise StepError
+
+        fields = {
+            "csrfmiddlewaretoken": token.group(1),
+            "project_name": f"Proyecto de carga {uuid.uuid4().hex[:8]}",
+            "building_type": random.choice(("residential", "commercial")),
+        }
+        for flag in random.choice(COMBINATIONS):
+            fields[flag] = "on"
+        clients = CLIENT_OPTION_RE.findall(page)
+        if clients and random.random() >= self.options.new_client_ratio:
+            fields["existing_client"] = random.choice(clients)
+        else:
+            suffix = uuid.uuid4().hex[:6]
+            fields.update({
+                "new_client_title": random.choice(CLIENT_TITLES),
+                "new_client_name": f"Cliente Carga {suffix}",
+                "new_client_position": "Gerente de proyecto",
+                "new_client_company": f"Constructora {suffix}",
+                "new_client_city": "Medellín",
+                "new_client_email": f"carga-{suffix}@example.com",
+                "new_client_phone": "3000000000",
+            })
+
+        response, _ = self.timed(session, "create", "POST", "/", fields, expect=302)
+        match = QUOTE_URL_RE.search(urlsplit(response.headers.get("Location", "")).path)
+        if match is None:
+            self.record("create", 0, f"unexpected redirect to {response.headers.get('Location')!r}")
+            raise StepError
+        details_path = f"/quote/{match.group(1)}/"
+
+        self.think()
+        _, content = self.timed(session, "details", "GET", details_path)
+        page = content.decode("utf-8", "replace")
+        token = CSRF_TOKEN_RE.search(page)
+        norms = NORM_RE.findall(page)
+        notes = random.randint(0, 3)
+        fields = {
+            "csrfmiddlewaretoken": token.group(1) if token else "",
+            "manual_requirements": "\n".join(random.sample(SAMPLE_ITEMS, random.randint(0, 2))),
+            "manual_items_detection": "\n".join(random.sample(SAMPLE_ITEMS, random.randint(0, 3))),
+            "manual_items_protection": "\n".join(random.sample(SAMPLE_ITEMS, random.randint(0, 3))),
+            "manual_items_sh": "\n".join(random.sample(SAMPLE_ITEMS, random.randint(0, 3))),
+            "payment_advance": "40",
+            "payment_first_version": "40",
+            "payment_final": "20",
+            "delivery_time_value": str(random.randint(5, 30)),
+            "delivery_time_unit": random.choice(("days", "weeks", "months")),
+            "notes_count": str(notes),
+            "selected_norms": random.sample(norms, random.randint(0, min(len(norms), 6))),
+        }
+        for i in range(1, notes + 1):
+            fields[f"note_{i}"] = f"Nota de prueba {i}"
+
+        self.think()
+        response, _ = self.timed(session, "generate", "POST", details_path, fields)
+        if response.headers.get("Content-Type") != DOCX_TYPE:
+            self.record("generate", 0, f"expected a .docx, got {response.headers.get('Content-Type')}")
+            raise StepError
+
+        _, content = self.timed(session, "download", "GET", details_path + "download/")
+        if not content.startswith(b"PK"):
+            self.record("download", 0, "download is not a .docx")
+            raise StepError
+
+        with self.lock:
+            self.sessions += 1
+
+    def think(self):
+        if self.options.think_time:
+            time.sleep(random.uniform(0, self.options.think_time))
+
+    def user(self, deadline):
+        # A fresh browser (cookies, connection) for every session
+        while time.monotonic() < deadline:
+            session = Session(self.options.url, self.options.timeout)
+            try:
+                self.run_session(session)
+            except StepError:
+                pass
+            finally:
+                session.close()
+
+    def run_stage(self, users, duration):
+        self.reset()
+        deadline = time.monotonic() + duration
+        threads = [threading.Thread(target=self.user, args=(deadline,), daemon=True) for _ in range(users)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.stage_report(users, time.perf_counter() - start)
+
+    def stage_report(self, users, elapsed):
+        steps = {}
+        all_latencies = []
+        for step in STEPS:
+            latencies = sorted(self.latencies[step])
+            all_latencies.extend(latencies)
+            steps[step] = summarize(latencies, self.errors[step])
+        all_latencies.sort()
+        total = summarize(all_latencies, sum(self.errors.values()))
+        return {
+            "users": users,
+            "seconds": round(elapsed, 2),
+            "sessions": self.sessions,
+            "sessions_per_second": round(self.sessions / elapsed, 2),
+            "requests_per_second": round(total["requests"] / elapsed, 2),
+            "error_rate": total["error_rate"],
+            "steps": steps,
+            "total": total,
+            "error_samples": list(self.error_samples),
+        }
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile of a sorted list
+    if not values:
+        return None
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+def summarize(latencies, errors):
+    requests = len(latencies) + errors
+    summary = {"requests": requests, "errors": errors, "error_rate": round(errors / requests, 4) if requests else 0}
+    for pct in (50, 90, 95, 99):
+        value = percentile(latencies, pct)
+        summary[f"p{pct}_ms"] = round(value * 1000, 1) if value is not None else None
+    return summary
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+
+def print_stage(report):
+    print(
+        f"\n== {report['users']} users, {report['seconds']} s: {report['sessions']} sessions "
+        f"({report['sessions_per_second']}/s), {report['requests_per_second']} req/s, "
+        f"errors {report['error_rate']:.2%}"
+    )
+    print(f"   {'step':<10}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, summary in list(report["steps"].items()) + [("total", report["total"])]:
+        print(
+            f"   {name:<10}{summary['requests']:>9}{summary['errors']:>8}"
+            + "".join(f"{format_ms(summary[f'p{p}_ms']):>9}" for p in (50, 90, 95, 99))
+        )
+    for sample in report["error_samples"]:
+        print(f"   ! {sample}")
+
+
+def check_local(url):
+    # Refuse to load-test anything but this machine
+    host = urlsplit(url).hostname or ""
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror as exc:
+        sys.exit(f"Cannot resolve {host!r}: {exc}")
+    if not all(ipaddress.ip_address(a.split("%")[0]).is_loopback for a in addresses):
+        sys.exit(f"{host} is not a local address; use --allow-remote to test it anyway.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the FireQuote quote workflow.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL (default http://127.0.0.1:8000).")
+    parser.add_argument("--stages", default="1,5,10,20",
+                        help="Concurrent users of each ramp stage, comma separated (default 1,5,10,20).")
+    parser.add_argument("--stage-duration", type=float, default=30, help="Seconds per stage (default 30).")
+    parser.add_argument("--think-time", type=float, default=0,
+                        help="Max random pause between steps, in seconds (default 0: capacity test).")
+    parser.add_argument("--new-client-ratio", type=float, default=0.3,
+                        help="Share of sessions creating a new client (default 0.3).")
+    parser.add_argument("--timeout", type=float, default=60, help="Request timeout in seconds (default 60).")
+    parser.add_argument("--seed", type=int, help="Random seed, for repeatable sessions.")
+    parser.add_argument("--output", help="Also write the report as JSON to this file.")
+    parser.add_argument("--allow-remote", action="store_true", help="Allow a non-local --url.")
+    options = parser.parse_args()
+
+    if urlsplit(options.url).scheme != "http":
+        sys.exit("Only http:// URLs are supported.")
+    if not options.allow_remote:
+        check_local(options.url)
+    if options.seed is not None:
+        random.seed(options.seed)
+    stages = [int(users) for users in options.stages.split(",") if users.strip()]
+
+    runner = Runner(options)
+    reports = []
+    print(f"Load test of {options.url}: stages {stages}, {options.stage_duration:g} s each")
+    for users in stages:
+        report = runner.run_stage(users, options.stage_duration)
+        reports.append(report)
+        print_stage(report)
+
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump({"url": options.url, "stages": reports}, f, indent=2)
+        print(f"\nReport written to {options.output}")
+
+
+if __name__ == "__main__":
+    main()
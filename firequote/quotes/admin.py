@@ -1,24 +1,100 @@
 # quotes/admin.py
+from django import forms
 from django.contrib import admin
-from .models import Client, Norm, TemplateDoc, Quote
+from django.db import transaction
+from . import pricing
+from .models import Client, Norm, TemplateDoc, Quote, LibraryItem, ArchivedDocument, RateBand, Tenant
+
+@admin.register(Tenant)
+class TenantAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'domain', 'created_at')
+    search_fields = ('name', 'slug', 'domain')
 
 @admin.register(Client)
 class ClientAdmin(admin.ModelAdmin):
-    list_display = ('full_name', 'company', 'city', 'created_at')
+    list_display = ('full_name', 'company', 'city', 'tenant', 'created_at')
+    list_filter = ('tenant',)
     search_fields = ('full_name', 'company', 'city')
 
 @admin.register(Norm)
 class NormAdmin(admin.ModelAdmin):
-    list_display = ('code', 'is_default', 'description')
+    list_display = ('code', 'is_default', 'description', 'tenant')
+    list_filter = ('tenant', 'is_default')
     search_fields = ('code',)
 
 @admin.register(TemplateDoc)
 class TemplateDocAdmin(admin.ModelAdmin):
-    list_display = ('name', 'services_tag', 'formats_tag')
+    list_display = ('name', 'services_tag', 'formats_tag', 'tenant')
+    list_filter = ('tenant',)
     search_fields = ('name',)
 
+class QuoteAdminForm(forms.ModelForm):
+    # Client, template and norms are offered from the quote's office only;
+    # Quote.clean() checks client and template, clean() the norms
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.tenant_id:
+            for field in ('client', 'template_doc', 'norms'):
+                if field in self.fields:
+                    self.fields[field].queryset = self.fields[field].queryset.for_tenant(self.instance.tenant_id)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        tenant = cleaned_data.get('tenant') or (self.instance.tenant if self.instance.tenant_id else None)
+        norms = cleaned_data.get('norms')
+        if tenant and norms and any(norm.tenant_id != tenant.id for norm in norms):
+            self.add_error('norms', 'Hay normas de otra oficina.')
+        return cleaned_data
+
 @admin.register(Quote)
 class QuoteAdmin(admin.ModelAdmin):
-    list_display = ('project_name', 'client', 'created_at', 'total_value')
-    list_filter = ('is_detection', 'is_protection', 'is_human_safety')
+    form = QuoteAdminForm
+    list_display = ('project_name', 'client', 'created_at', 'total_value', 'manual_pricing')
+    list_filter = ('tenant', 'is_detection', 'is_protection', 'is_human_safety', 'manual_pricing')
     search_fields = ('project_name', 'client__full_name', 'client__company')
+
+    def get_readonly_fields(self, request, obj=None):
+        # A quote stays in its office: its client, norms and documents are that office's
+        readonly = super().get_readonly_fields(request, obj)
+        return (*readonly, 'tenant') if obj else readonly
+
+@admin.register(RateBand)
+class RateBandAdmin(admin.ModelAdmin):
+    list_display = ('service', 'building_type', 'min_area', 'rate_per_sqm', 'minimum_fee', 'updated_at')
+    list_editable = ('rate_per_sqm', 'minimum_fee')
+    list_filter = ('service', 'building_type')
+
+    # Rate changes re-price the open quotes once the change is committed,
+    # once per request (list_editable saves every edited row separately)
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.schedule_reprice(request)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.schedule_reprice(request)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        self.schedule_reprice(request)
+
+    def schedule_reprice(self, request):
+        if not getattr(request, "_reprice_scheduled", False):
+            request._reprice_scheduled = True
+            transaction.on_commit(lambda: self.reprice(request))
+
+    def reprice(self, request):
+        checked, changed = pricing.reprice_open_quotes()
+        self.message_user(request, f"Cotizaciones abiertas re-cotizadas: {changed} de {checked}.")
+
+@admin.register(LibraryItem)
+class LibraryItemAdmin(admin.ModelAdmin):
+    list_display = ('text', 'section', 'usage_count', 'tenant', 'updated_at')
+    list_filter = ('tenant', 'section')
+    search_fields = ('text',)
+
+@admin.register(ArchivedDocument)
+class ArchivedDocumentAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'quote', 'size', 'created_at', 'last_accessed_at')
+    search_fields = ('filename', 'quote__project_name')
+    exclude = ('manifest', 'blobs')
@@ -0,0 +1,131 @@
+"""
+quotes/api.py
+-------------
+JSON API for programmatic quote creation (e.g. from the CRM).
+
+Every request must send `Authorization: Bearer <token>` with the API token
+of the tenant of the request host (`manage.py issue_api_token <slug>`); the
+API is disabled for tenants without one. Records are created in (and looked
+up from) that tenant, like the HTML views, so a token only reaches the
+records of its own office.
+
+    POST api/clients/                  {"full_name": ..., "company": ..., ...}
+    POST api/clients/batch/            {"clients": [{...}, ...]}
+    POST api/quotes/                   {"client_id": 1 | "client": {...}, "project_name": ...,
+                                        "is_detection": true, ..., "norms": [1, 2]}
+    POST api/quotes/batch/             {"quotes": [{...}, ...]}
+    POST api/quotes/<id>/generate/     returns the generated .docx
+
+Quote fields are the ones accepted by services.build_quote().
+"""
+
+import hmac
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import services
+from .models import Quote, Tenant
+from .views import document_response
+
+# Largest batch accepted in one call
+BATCH_LIMIT = 500
+
+
+def error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def authenticated(request):
+    # The bearer token must be the one of the request's tenant. The digest is
+    # read from the database (not the tenant registry) so revoking a token
+    # takes effect at once in every process.
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    digest = Tenant.objects.filter(pk=request.tenant.pk).values_list("api_token_digest", flat=True).first()
+    if scheme != "Bearer" or not token or not digest:
+        return False
+    return hmac.compare_digest(Tenant.token_digest(token), digest)
+
+
+def api_view(view):
+    # Token authentication, JSON body parsing and ServiceError -> 400
+    @csrf_exempt
+    @require_POST
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not authenticated(request):
+            return error("Unauthorized", status=401)
+
+        try:
+            payload = json.loads(request.body or b"{}")
+        except ValueError:
+            return error("Invalid JSON body")
+        if not isinstance(payload, dict):
+            return error("The JSON body must be an object")
+
+        try:
+            return view(request, payload, *args, **kwargs)
+        except services.ServiceError as exc:
+            return error(str(exc))
+
+    return wrapper
+
+
+def batch_items(payload, key):
+    items = payload.get(key)
+    if not isinstance(items, list) or not items:
+        raise services.ServiceError(f'"{key}" must be a non-empty list')
+    if len(items) > BATCH_LIMIT:
+        raise services.ServiceError(f'"{key}" accepts at most {BATCH_LIMIT} entries per call')
+    if not all(isinstance(item, dict) for item in items):
+        raise services.ServiceError(f'Every entry of "{key}" must be an object')
+    return items
+
+
+def quote_data(quote):
+    return {
+        "id": quote.id,
+        "client_id": quote.client_id,
+        "project_name": quote.project_name,
+        "details_url": reverse("quote_details", args=[quote.id]),
+        "download_url": reverse("quote_download", args=[quote.id]),
+    }
+
+
+@api_view
+def client_create(request, payload):
+    client = services.create_client(payload, request.tenant)
+    return JsonResponse({"id": client.id}, status=201)
+
+
+@api_view
+def client_batch(request, payload):
+    clients = services.create_clients(batch_items(payload, "clients"), request.tenant)
+    return JsonResponse({"ids": [c.id for c in clients]}, status=201)
+
+
+@api_view
+def quote_create(request, payload):
+    # A new client can be created inline instead of passing client_id
+    if not payload.get("client_id") and isinstance(payload.get("client"), dict):
+        payload["client_id"] = services.create_client(payload["client"], request.tenant).id
+    quote = services.create_quote(payload, request.tenant, payload.get("norms", []))
+    return JsonResponse(quote_data(quote), status=201)
+
+
+@api_view
+def quote_batch(request, payload):
+    quotes = services.create_quotes(batch_items(payload, "quotes"), request.tenant)
+    return JsonResponse({"quotes": [quote_data(q) for q in quotes]}, status=201)
+
+
+@api_view
+def quote_generate(request, payload, quote_id):
+    quote = get_object_or_404(Quote.objects.for_tenant(request.tenant).select_related("client"), id=quote_id)
+    output_filename, content = services.generate_document(quote)
+    return document_response(output_filename, content)
@@ -0,0 +1,247 @@
+"""
+quotes/archive.py
+-----------------
+Archive of generated .docx documents, kept in the "archive" storage
+(MEDIA_ROOT/archive by default, see STORAGES in settings.py).
+
+Documents are content-addressed per zip member: every member (styles,
+numbering, images, document.xml...) is stored once as a zlib blob named by
+the sha256 of its content, and each ArchivedDocument keeps the manifest
+needed to reassemble the .docx. Documents generated from the same template
+share almost all their members, so each new version costs little more
+than its own document.xml.
+
+Storage tiers:
+    archived   manifest + blobs available, served as generated
+    expired    dropped by compact(); only the quote data remains and the
+               document is regenerated on demand (services.get_document)
+"""
+
+import hashlib
+import io
+import os
+import zipfile
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import ArchiveBlob, ArchivedDocument
+
+BLOB_DIR = "blobs"
+
+STRAY_FILE_GRACE = timedelta(hours=1)
+
+
+def get_storage():
+    return storages["archive"]
+
+
+def blob_path(digest):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}.z"
+
+
+def write_blob(storage, digest, packed):
+    # Store a blob file; the caller holds its row lock. Files are named by
+    # content, so one already there (left by a call that rolled back, or
+    # written by the call that created the row) is kept when intact.
+    path = blob_path(digest)
+    if storage.exists(path):
+        with storage.open(path) as f:
+            try:
+                intact = hashlib.sha256(zlib.decompress(f.read())).hexdigest() == digest
+            except zlib.error:
+                intact = False
+        if intact:
+            return
+        storage.delete(path)  # Truncated by a crash mid-write
+    storage.save(path, ContentFile(packed))
+
+
+def delete_stray_file(storage, digest, path):
+    # Delete a blob file that has no row. A placeholder row claims the digest
+    # meanwhile, so archive_document() cannot start reusing the file; if a
+    # row exists (or is being inserted) the file is not a stray after all.
+    try:
+        with transaction.atomic():
+            placeholder = ArchiveBlob.objects.create(digest=digest, size=0, stored_size=0)
+            storage.delete(path)
+            placeholder.delete()
+    except IntegrityError:
+        return False
+    return True
+
+
+def archive_document(quote, filename, content):
+    # Store a generated .docx (bytes) for a quote; returns the ArchivedDocument
+    storage = get_storage()
+    members = []
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        for info in zf.infolist():
+            data = zf.read(info)
+            members.append((info, hashlib.sha256(data).hexdigest(), data))
+    digests = {digest for _, digest, _ in members}
+
+    with transaction.atomic():
+        # Lock the blobs we reuse so a concurrent compaction cannot drop them.
+        # select_for_update() queries the primary, never the replica.
+        present = dict(
+            ArchiveBlob.objects.select_for_update(no_key=True)
+            .filter(digest__in=digests)
+            .values_list("digest", "id")
+        )
+        new_blobs = {}
+        for info, digest, data in members:
+            if digest not in present and digest not in new_blobs:
+                new_blobs[digest] = (data, zlib.compress(data, 6))
+        blob_ids = dict(present)
+        if new_blobs:
+            # Claim the new blobs with their rows before writing any file: a
+            # concurrent call inserting the same blob, or compact() sweeping a
+            # stray file of it, waits for this transaction. ignore_conflicts
+            # leaves the ids unset, hence the second (locking) query.
+            ArchiveBlob.objects.bulk_create(
+                [
+                    ArchiveBlob(digest=digest, size=len(data), stored_size=len(packed))
+                    for digest, (data, packed) in new_blobs.items()
+                ],
+                ignore_conflicts=True,
+            )
+            blob_ids.update(
+                ArchiveBlob.objects.select_for_update(no_key=True)
+                .filter(digest__in=new_blobs)
+                .values_list("digest", "id")
+            )
+            for digest, (_, packed) in new_blobs.items():
+                write_blob(storage, digest, packed)
+
+        document = ArchivedDocument.objects.create(
+            quote=quote,
+            filename=filename,
+            digest=hashlib.sha256(content).hexdigest(),
+            size=len(content),
+            manifest=[
+                {
+                    "name": info.filename,
+                    "blob": digest,
+                    "compress_type": info.compress_type,
+                    "date_time": list(info.date_time),
+                }
+                for info, digest, _ in members
+            ],
+        )
+        document.blobs.set(blob_ids.values())
+    return document
+
+
+def open_document(document, touch=True):
+    # Reassemble the .docx bytes of an archived document; touch=False leaves
+    # last_accessed_at (and so the retention clock) alone
+    storage = get_storage()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for member in document.manifest:
+            with storage.open(blob_path(member["blob"])) as f:
+                data = zlib.decompress(f.read())
+            info = zipfile.ZipInfo(member["name"], date_time=tuple(member["date_time"]))
+            info.compress_type = member["compress_type"]
+            zf.writestr(info, data)
+
+    if touch:
+        ArchivedDocument.objects.filter(pk=document.pk).update(last_accessed_at=timezone.now())
+    return buffer.getvalue()
+
+
+def current_document(quote_id, sources_modified, fields=None):
+    """
+    Latest archived document of a quote if it was generated after its sources
+    (quote, client, norms, template) last changed, otherwise None.
+    """
+    documents = ArchivedDocument.objects.filter(quote_id=quote_id).order_by("-created_at")
+    if fields:
+        documents = documents.only(*fields)
+    document = documents.first()
+    if document is None or (sources_modified and document.created_at < sources_modified):
+        return None
+    return document
+
+
+def compact(retention_days=None, keep_versions=None, dry_run=False):
+    """
+    Apply the retention policy and reclaim storage:
+      - drop documents not accessed for `retention_days`,
+      - keep at most `keep_versions` documents per quote,
+      - delete the blobs (and stray files) no remaining document uses.
+    Returns a report dict; with dry_run nothing is deleted.
+    """
+    if retention_days is None:
+        retention_days = settings.FIREQUOTE_ARCHIVE_RETENTION_DAYS
+    if keep_versions is None:
+        keep_versions = settings.FIREQUOTE_ARCHIVE_KEEP_VERSIONS
+
+    storage = get_storage()
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    superseded = ArchivedDocument.objects.annotate(
+        version=Window(RowNumber(), partition_by=[F("quote_id")], order_by=F("created_at").desc())
+    ).filter(version__gt=keep_versions)
+
+    with transaction.atomic():
+        drop_ids = set(ArchivedDocument.objects.filter(last_accessed_at__lt=cutoff).values_list("id", flat=True))
+        drop_ids |= set(superseded.values_list("id", flat=True))
+        dropped = ArchivedDocument.objects.filter(id__in=drop_ids)
+        dropped_bytes = dropped.aggregate(total=Sum("size"))["total"] or 0
+
+        # Blobs not used by any document that survives
+        survivors = ArchivedDocument.objects.exclude(id__in=drop_ids)
+        orphans = ArchiveBlob.objects.exclude(documents__in=survivors).select_for_update(skip_locked=True)
+        orphan_rows = list(orphans.values_list("id", "digest", "stored_size"))
+
+        report = {
+            "documents_dropped": len(drop_ids),
+            "document_bytes_dropped": dropped_bytes,
+            "blobs_deleted": len(orphan_rows),
+            "bytes_reclaimed": sum(size for _, _, size in orphan_rows),
+            "stray_files_deleted": 0,
+        }
+        if dry_run:
+            return report
+
+        dropped.delete()
+        ArchiveBlob.objects.filter(id__in=[pk for pk, _, _ in orphan_rows]).delete()
+        # Deleted while the rows are still locked: archive_document() waits for
+        # this transaction and then writes any blob it needs again
+        for _, digest, _ in orphan_rows:
+            storage.delete(blob_path(digest))
+
+    # Files left behind by failed archive_document() calls (recent ones are
+    # left alone as well)
+    stray_cutoff = timezone.now() - STRAY_FILE_GRACE
+    known = set(ArchiveBlob.objects.values_list("digest", flat=True))
+    if storage.exists(BLOB_DIR):
+        for prefix in storage.listdir(BLOB_DIR)[0]:
+            directory = f"{BLOB_DIR}/{prefix}"
+            for name in storage.listdir(directory)[1]:
+                digest = os.path.splitext(name)[0]
+                path = f"{directory}/{name}"
+                if digest not in known and storage.get_modified_time(path) < stray_cutoff:
+                    size = storage.size(path)
+                    if delete_stray_file(storage, digest, path):
+                        report["bytes_reclaimed"] += size
+                        report["stray_files_deleted"] += 1
+    return report
+
+
+def archive_usage():
+    # Logical size of the archived documents vs. bytes actually stored
+    return {
+        "documents": ArchivedDocument.objects.count(),
+        "document_bytes": ArchivedDocument.objects.aggregate(total=Sum("size"))["total"] or 0,
+        "blobs": ArchiveBlob.objects.count(),
+        "stored_bytes": ArchiveBlob.objects.aggregate(total=Sum("stored_size"))["total"] or 0,
+    }
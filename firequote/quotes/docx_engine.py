@@ -0,0 +1,242 @@
+"""
+quotes/docx_engine.py
+---------------------
+Fast rendering of .docx templates that only substitute plain variables
+(`{{ client_name }}`, `{{ items_detection }}`...).
+
+Each template is compiled once per process: the XML parts holding tags are
+cleaned the way docxtpl does (Word splits `{{ name }}` across several runs)
+and split into static chunks and variable slots; every other zip member is
+kept as its raw compressed bytes. Rendering then only escapes the values,
+joins the chunks and writes the zip, copying the untouched members
+byte-for-byte without recompressing them.
+
+Templates using anything else (`{% for %}`, `{% if %}`, filters,
+expressions, `{{r ...}}`...) fall back to docxtpl automatically.
+"""
+
+import io
+import os
+import re
+import struct
+import threading
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+# Zip members that may hold template tags (same parts docxtpl renders)
+TEMPLATE_PART_RE = re.compile(r"^(word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml|docProps/core\.xml)$")
+
+# Word inserts tags between the two braces of "{{" / "}}" (docxtpl.patch_xml)
+SPLIT_BRACES_RE = re.compile(r"(?<={)(<[^>]*>)+(?=[\{%\#])|(?<=[%\}\#])(<[^>]*>)+(?=\})", re.DOTALL)
+TAG_BODY_RE = re.compile(r"{%(?:(?!%}).)*|{#(?:(?!#}).)*|{{(?:(?!}}).)*", re.DOTALL)
+RUN_BREAK_RE = re.compile(r"</w:t>.*?(<w:t>|<w:t [^>]*>)", re.DOTALL)
+
+SIMPLE_VAR_RE = re.compile(r"{{\s*([A-Za-z_][A-Za-z0-9_]*)\s*}}")
+ANY_TAG_RE = re.compile(r"{{|{%|{#")
+
+RUN_OPEN_RE = re.compile(r"<w:r(?:\s[^>]*)?>")
+PARAGRAPH_OPEN_RE = re.compile(r"<w:p(?:\s[^>]*)?>")
+RUN_PROPERTIES_RE = re.compile(r"<w:rPr>.*?</w:rPr>", re.DOTALL)
+PARAGRAPH_PROPERTIES_RE = re.compile(r"<w:pPr>.*?</w:pPr>", re.DOTALL)
+
+
+class NotSimpleTemplate(Exception):
+    pass
+
+
+def patch_xml(xml):
+    # Join the text of tags that Word split across runs, as docxtpl does
+    xml = SPLIT_BRACES_RE.sub("", xml)
+    return TAG_BODY_RE.sub(lambda m: RUN_BREAK_RE.sub("", m.group(0)), xml)
+
+
+def last_match(pattern, text):
+    match = None
+    for match in pattern.finditer(text):
+        pass
+    return match
+
+
+class Slot:
+    # A variable in a template part, with the formatting needed to turn
+    # tabs/newlines of its value into Word runs (docxtpl's resolve_listing).
+
+    def __init__(self, name, preceding_xml):
+        self.name = name
+        self.run_properties = None
+        self.paragraph_properties = ""
+
+        run = last_match(RUN_OPEN_RE, preceding_xml)
+        run_end = preceding_xml.rfind("</w:r>")
+        if run is not None and run.start() > run_end and "<w:t" in preceding_xml[run.end():]:
+            found = RUN_PROPERTIES_RE.search(preceding_xml[run.start():])
+            self.run_properties = found.group(0) if found else ""
+
+            paragraph = last_match(PARAGRAPH_OPEN_RE, preceding_xml)
+            if paragraph is not None:
+                found = PARAGRAPH_PROPERTIES_RE.search(preceding_xml[paragraph.start():])
+                self.paragraph_properties = found.group(0) if found else ""
+
+    def render(self, value):
+        text = escape("" if value is None else str(value))
+        if self.run_properties is None or not any(c in text for c in "\t\a\n\f"):
+            return text
+
+        rpr, ppr = self.run_properties, self.paragraph_properties
+        text = text.replace(
+            "\t",
+            '</w:t></w:r><w:r>%s<w:tab/></w:r><w:r>%s<w:t xml:space="preserve">' % (rpr, rpr),
+        )
+        text = text.replace(
+            "\a",
+            '</w:t></w:r></w:p><w:p>%s<w:r>%s<w:t xml:space="preserve">' % (ppr, rpr),
+        )
+        text = text.replace("\n", '</w:t><w:br/><w:t xml:space="preserve">')
+        text = text.replace(
+            "\f",
+            '</w:t></w:r></w:p><w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+            '<w:p>%s<w:r>%s<w:t xml:space="preserve">' % (ppr, rpr),
+        )
+        return text
+
+
+class CompiledPart:
+    def __init__(self, xml):
+        self.chunks = []  # static XML, encoded once
+        self.slots = []  # len(chunks) == len(slots) + 1
+        position = 0
+        for match in SIMPLE_VAR_RE.finditer(xml):
+            self.chunks.append(xml[position:match.start()].encode("utf-8"))
+            self.slots.append(Slot(match.group(1), xml[:match.start()]))
+            position = match.end()
+        self.chunks.append(xml[position:].encode("utf-8"))
+
+        leftovers = b"".join(self.chunks)
+        if ANY_TAG_RE.search(leftovers.decode("utf-8")):
+            raise NotSimpleTemplate
+
+    def render(self, context):
+        out = [self.chunks[0]]
+        for slot, chunk in zip(self.slots, self.chunks[1:]):
+            out.append(slot.render(context.get(slot.name, "")).encode("utf-8"))
+            out.append(chunk)
+        return b"".join(out)
+
+
+def dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11 | minute << 5 | second // 2), ((year - 1980) << 9 | month << 5 | day)
+
+
+class Member:
+    # One zip member: raw compressed bytes (static) or a CompiledPart (dynamic)
+
+    def __init__(self, info, raw=None, part=None):
+        self.name = info.filename.encode("utf-8")
+        self.flags = (info.flag_bits & ~0x08) | (0x800 if not info.filename.isascii() else 0)
+        self.compress_type = info.compress_type
+        self.dos_time, self.dos_date = dos_datetime(info.date_time)
+        self.external_attr = info.external_attr
+        self.crc = info.CRC
+        self.file_size = info.file_size
+        self.raw = raw
+        self.part = part
+
+
+class CompiledTemplate:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            source = f.read()
+
+        self.members = []
+        has_tags = False
+        with zipfile.ZipFile(io.BytesIO(source)) as zf:
+            for info in zf.infolist():
+                if TEMPLATE_PART_RE.match(info.filename):
+                    xml = patch_xml(zf.read(info).decode("utf-8"))
+                    if ANY_TAG_RE.search(xml):
+                        self.members.append(Member(info, part=CompiledPart(xml)))
+                        has_tags = True
+                        continue
+
+                # Raw compressed data, located through the local file header
+                offset = info.header_offset
+                name_length, extra_length = struct.unpack("<HH", source[offset + 26:offset + 30])
+                start = offset + 30 + name_length + extra_length
+                self.members.append(Member(info, raw=source[start:start + info.compress_size]))
+        if not has_tags:
+            raise NotSimpleTemplate
+
+    def render(self, context):
+        out = io.BytesIO()
+        central_directory = []
+        for member in self.members:
+            if member.part is not None:
+                data = member.part.render(context)
+                crc, file_size = zlib.crc32(data), len(data)
+                compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                raw = compressor.compress(data) + compressor.flush()
+                compress_type = zipfile.ZIP_DEFLATED
+            else:
+                raw, crc, file_size = member.raw, member.crc, member.file_size
+                compress_type = member.compress_type
+
+            offset = out.tell()
+            out.write(struct.pack(
+                "<4s5H3L2H", b"PK\x03\x04", 20, member.flags, compress_type,
+                member.dos_time, member.dos_date, crc, len(raw), file_size, len(member.name), 0,
+            ))
+            out.write(member.name)
+            out.write(raw)
+            central_directory.append(struct.pack(
+                "<4s6H3L5H2L", b"PK\x01\x02", 20, 20, member.flags, compress_type,
+                member.dos_time, member.dos_date, crc, len(raw), file_size, len(member.name),
+                0, 0, 0, 0, member.external_attr, offset,
+            ) + member.name)
+
+        directory_offset = out.tell()
+        directory = b"".join(central_directory)
+        out.write(directory)
+        out.write(struct.pack(
+            "<4s4H2LH", b"PK\x05\x06", 0, 0, len(self.members), len(self.members),
+            len(directory), directory_offset, 0,
+        ))
+        return out.getvalue()
+
+
+# (namespace, path) -> (mtime, CompiledTemplate or None when the template needs docxtpl)
+# The namespace is the tenant slug: each tenant's template set is cached on its own.
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def get_compiled(path, namespace=""):
+    key = (namespace, path)
+    mtime = os.path.getmtime(path)
+    cached = _compiled.get(key)
+    if cached is None or cached[0] != mtime:
+        with _compiled_lock:
+            cached = _compiled.get(key)
+            if cached is None or cached[0] != mtime:
+                try:
+                    compiled = CompiledTemplate(path)
+                except NotSimpleTemplate:
+                    compiled = None
+                cached = _compiled[key] = (mtime, compiled)
+    return cached[1]
+
+
+def render_docx(template_path, context, namespace=""):
+    # Render a .docx template to bytes, with the fast path when possible
+    compiled = get_compiled(template_path, namespace)
+    if compiled is not None:
+        return compiled.render(context)
+
+    from docxtpl import DocxTemplate
+
+    doc = DocxTemplate(template_path)
+    doc.render(context, autoescape=True)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
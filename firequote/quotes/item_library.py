@@ -0,0 +1,246 @@
+"""
+quotes/item_library.py
+----------------------
+Library of reusable manual items (additional requirements and detection,
+protection and human safety bullets) mined from saved quotes.
+
+Items are stored in the LibraryItem table with a usage counter and served
+from an in-memory prefix index (sorted keys + bisect), so the quote details
+page can suggest items on every keystroke without a database round trip.
+
+Each tenant has its own library: items typed in one office's quotes are
+never suggested to another.
+"""
+
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import LibraryItem, Quote
+
+# Library section -> Quote field that stores the manual items of that section
+SECTION_FIELDS = {
+    "requirements": "manual_requirements",
+    "detection": "manual_items_detection",
+    "protection": "manual_items_protection",
+    "human_safety": "manual_items_sh",
+}
+
+# Characters engineers type (or paste from Word) as bullet markers
+BULLET_CHARS = "-–—•·*\t "
+
+# Each worker process keeps its own index; reload it periodically so items
+# saved through other workers show up without a restart.
+REFRESH_SECONDS = getattr(settings, "ITEM_LIBRARY_REFRESH_SECONDS", 300)
+
+
+# Utility: clean a typed item for display (no bullet marker, single spaces)
+def clean_item(text):
+    return " ".join(str(text).strip().lstrip(BULLET_CHARS).split())
+
+
+# Utility: build the lookup key of an item (lowercase, no accents, single spaces)
+def normalize_item(text):
+    decomposed = unicodedata.normalize("NFKD", clean_item(text))
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return without_accents.casefold()
+
+
+# Utility: map each distinct item of a multiline text to its display text
+def item_map(text):
+    items = {}
+    for line in (text or "").split("\n"):
+        cleaned = clean_item(line)
+        if cleaned:
+            items.setdefault(normalize_item(cleaned), cleaned)
+    return items
+
+
+class PrefixIndex:
+    # Sorted array of item keys per (tenant id, section), searched with bisect.
+
+    def __init__(self):
+        self._keys = {}  # (tenant id, section) -> sorted list of normalized keys
+        self._entries = {}  # (tenant id, section) -> {normalized key: [text, usage_count]}
+        self._lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+
+    def set(self, scope, key, text, count):
+        with self._lock:
+            entries = self._entries.setdefault(scope, {})
+            if key not in entries:
+                insort(self._keys.setdefault(scope, []), key)
+            entries[key] = [text, count]
+
+    def adjust(self, scope, key, text, delta):
+        with self._lock:
+            entries = self._entries.setdefault(scope, {})
+            if key not in entries:
+                insort(self._keys.setdefault(scope, []), key)
+                entries[key] = [text, 0]
+            entries[key][1] = max(entries[key][1] + delta, 0)
+
+    def suggest(self, scope, prefix, limit=10):
+        # Return the most used items of a scope whose key starts with the prefix
+        key = normalize_item(prefix)
+        with self._lock:
+            keys = self._keys.get(scope, [])
+            entries = self._entries.get(scope, {})
+            start = bisect_left(keys, key)
+            end = bisect_left(keys, key + "\U0010ffff")
+            candidates = [entries[k] for k in keys[start:end] if entries[k][1] > 0]
+        best = heapq.nsmallest(limit, candidates, key=lambda e: (-e[1], e[0]))
+        return [{"text": text, "count": count} for text, count in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def load_index():
+    # Build a fresh index from the LibraryItem table
+    index = PrefixIndex()
+    rows = LibraryItem.objects.values_list("tenant_id", "section", "normalized", "text", "usage_count")
+    for tenant_id, section, key, text, count in rows.iterator():
+        index.set((tenant_id, section), key, text, count)
+    return index
+
+
+def get_index():
+    # Return the process-wide index, loading it on first use or when stale
+    global _index
+    index = _index
+    if index is None or time.monotonic() - index.loaded_at > REFRESH_SECONDS:
+        with _index_lock:
+            if _index is None or time.monotonic() - _index.loaded_at > REFRESH_SECONDS:
+                _index = load_index()
+            index = _index
+    return index
+
+
+def reset_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def suggest(tenant_id, section, prefix, limit=10):
+    if section not in SECTION_FIELDS:
+        return []
+    return get_index().suggest((tenant_id, section), prefix, limit)
+
+
+def snapshot(quote):
+    # Capture the manual items of a quote before it is modified
+    return {section: getattr(quote, field) for section, field in SECTION_FIELDS.items()}
+
+
+def apply_changes(changes):
+    """
+    Apply usage counter changes, a dict (tenant id, section, key) -> [text,
+    delta], with a fixed number of queries however many items change.
+    """
+    if not changes:
+        return
+
+    # Loaded (if needed) before the counters change: a fresh index would
+    # otherwise count this save twice, once from the table and once on commit
+    index = get_index()
+    with transaction.atomic():
+        # Create the missing items, then lock every affected row so
+        # concurrent saves cannot lose each other's increments
+        LibraryItem.objects.bulk_create(
+            [
+                LibraryItem(tenant_id=tenant_id, section=section, normalized=key, text=text, usage_count=0)
+                for (tenant_id, section, key), (text, delta) in changes.items()
+                if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+        rows = LibraryItem.objects.select_for_update().filter(
+            tenant_id__in={tenant_id for tenant_id, _, _ in changes},
+            section__in={section for _, section, _ in changes},
+            normalized__in={key for _, _, key in changes},
+        )
+        items = []
+        for item in rows:
+            change = changes.get((item.tenant_id, item.section, item.normalized))
+            if change:
+                item.usage_count = max(item.usage_count + change[1], 0)
+                items.append(item)
+        LibraryItem.objects.bulk_update(items, ["usage_count"])
+
+    # Keep the in-memory index in step once the counters are committed
+    transaction.on_commit(
+        lambda: [
+            index.adjust((tenant_id, section), key, text, delta)
+            for (tenant_id, section, key), (text, delta) in changes.items()
+        ]
+    )
+
+
+def quote_changes(changes, quote, previous=None):
+    # Add to `changes` the items added to / removed from a quote since
+    # `previous` (a snapshot() taken before editing)
+    previous = previous or {}
+    for section, field in SECTION_FIELDS.items():
+        old_items = item_map(previous.get(section, ""))
+        new_items = item_map(getattr(quote, field))
+        diff = [(key, text, 1) for key, text in new_items.items() if key not in old_items]
+        diff += [(key, text, -1) for key, text in old_items.items() if key not in new_items]
+        for key, text, delta in diff:
+            change = changes.setdefault((quote.tenant_id, section, key), [text, 0])
+            change[1] += delta
+    return changes
+
+
+def sync_quote(quote, previous=None):
+    """
+    Update usage counters with the items added to / removed from a quote
+    since `previous` (a snapshot() taken before editing). Counters track how
+    many quotes use each item, so re-saving a quote does not inflate them.
+    """
+    apply_changes(quote_changes({}, quote, previous))
+
+
+def sync_quotes(quotes):
+    # Count the items of many new quotes (bulk_create) in one pass
+    changes = {}
+    for quote in quotes:
+        quote_changes(changes, quote)
+    apply_changes(changes)
+
+
+def rebuild_library():
+    """
+    Rebuild the whole library (every tenant) by mining the manual items of
+    every saved quote. Returns the number of distinct items per section.
+    """
+    found = {}  # (tenant id, section, key) -> [text, usage_count]
+    fields = list(SECTION_FIELDS.values())
+    for tenant_id, *row in Quote.objects.values_list("tenant_id", *fields).iterator():
+        for section, text in zip(SECTION_FIELDS, row):
+            for key, cleaned in item_map(text).items():
+                entry = found.setdefault((tenant_id, section, key), [cleaned, 0])
+                entry[1] += 1
+
+    with transaction.atomic():
+        LibraryItem.objects.all().delete()
+        LibraryItem.objects.bulk_create(
+            [
+                LibraryItem(tenant_id=tenant_id, section=section, normalized=key, text=text, usage_count=count)
+                for (tenant_id, section, key), (text, count) in found.items()
+            ],
+            batch_size=1000,
+        )
+    reset_index()
+
+    totals = {section: 0 for section in SECTION_FIELDS}
+    for _, section, _ in found:
+        totals[section] += 1
+    return totals
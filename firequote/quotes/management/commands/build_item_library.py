@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from quotes.item_library import rebuild_library
+
+
+class Command(BaseCommand):
+    help = "Rebuild the reusable item library by mining the manual items of all saved quotes."
+
+    def handle(self, *args, **options):
+        totals = rebuild_library()
+        for section, count in totals.items():
+            self.stdout.write(f"{section}: {count} items")
+        self.stdout.write(self.style.SUCCESS(f"Library rebuilt with {sum(totals.values())} items."))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from quotes import archive
+
+
+def human_size(num_bytes):
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the generated-document retention policy and delete unused archive blobs. "
+        "Meant to run on a schedule, e.g. nightly from cron: "
+        "0 3 * * * python manage.py compact_archive"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", type=int, help="Drop documents not accessed for this many days "
+                                                                "(default FIREQUOTE_ARCHIVE_RETENTION_DAYS).")
+        parser.add_argument("--keep-versions", type=int, help="Documents kept per quote "
+                                                              "(default FIREQUOTE_ARCHIVE_KEEP_VERSIONS).")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted without deleting.")
+
+    def handle(self, *args, **options):
+        before = archive.archive_usage()
+        report = archive.compact(
+            retention_days=options["retention_days"],
+            keep_versions=options["keep_versions"],
+            dry_run=options["dry_run"],
+        )
+        after = archive.archive_usage()
+
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(
+            f"{prefix}Documents dropped: {report['documents_dropped']} "
+            f"({human_size(report['document_bytes_dropped'])}, regenerated on demand)"
+        )
+        self.stdout.write(f"{prefix}Blobs deleted: {report['blobs_deleted']}, stray files: {report['stray_files_deleted']}")
+        self.stdout.write(
+            f"Archive: {after['documents']} documents ({human_size(after['document_bytes'])}) "
+            f"stored in {human_size(after['stored_bytes'])} (was {human_size(before['stored_bytes'])})"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Reclaimed {human_size(report['bytes_reclaimed'])}"))
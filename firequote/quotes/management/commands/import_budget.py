@@ -0,0 +1,94 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Entry point -> Python code run under `python -X importtime`
+TARGETS = {
+    "manage.py": ["manage.py", "check"],
+    "wsgi": ["-c", "import firequote.wsgi"],
+    "asgi": ["-c", "import firequote.asgi"],
+    # What the first request imports on top of wsgi (URLconf, views, services...)
+    "first-request": ["-c", "import firequote.wsgi; from django.urls import get_resolver; get_resolver().url_patterns"],
+}
+
+# Must only be imported on first use (or by firequote.warmup in workers)
+HEAVY_MODULES = ("docxtpl", "docx", "docxcompose", "lxml", "jinja2", "numpy", "pandas", "num2words", "babel")
+
+IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(args):
+    # {module: (self us, cumulative us)} of one interpreter run
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    modules = {}
+    errors = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+        elif not line.startswith("import time:"):
+            errors.append(line)
+    if result.returncode != 0:
+        raise CommandError(f"{' '.join(args)} failed:\n" + "\n".join(errors[-20:]))
+    return modules
+
+
+def total_ms(modules):
+    return sum(own for own, _ in modules.values()) / 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the import cost of each entry point (manage.py, wsgi, asgi and the "
+        "first request) per module and package, and fail when heavy modules are "
+        "imported eagerly or a time budget is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", action="append", choices=list(TARGETS),
+                            help="Entry point to measure (repeatable; default all).")
+        parser.add_argument("--top", type=int, default=15, help="Modules listed per entry point (default 15).")
+        parser.add_argument("--runs", type=int, default=3, help="Runs per entry point, the fastest is kept (default 3).")
+        parser.add_argument("--budget-ms", type=float, help="Fail if an entry point imports for longer than this.")
+        parser.add_argument("--allow", action="append", default=[],
+                            help="Heavy module allowed at import time (repeatable).")
+
+    def handle(self, *args, **options):
+        heavy = [name for name in HEAVY_MODULES if name not in options["allow"]]
+        failures = []
+        for target in options["target"] or list(TARGETS):
+            runs = [measure(TARGETS[target]) for _ in range(max(1, options["runs"]))]
+            modules = min(runs, key=total_ms)
+            total = total_ms(modules)
+
+            packages = defaultdict(int)
+            for name, (own, _) in modules.items():
+                packages[name.split(".")[0]] += own
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{target}: {total:.0f} ms, {len(modules)} modules"))
+            self.stdout.write(f"  {'cumulative ms':>13}  {'self ms':>8}  module")
+            ranked = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)
+            for name, (own, cumulative) in ranked[:options["top"]]:
+                self.stdout.write(f"  {cumulative / 1000:>13.1f}  {own / 1000:>8.1f}  {name}")
+            self.stdout.write(f"  {'package ms':>13}  package")
+            for name, own in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options["top"]]:
+                self.stdout.write(f"  {own / 1000:>13.1f}  {name}")
+
+            eager = sorted(name for name in heavy if name in modules)
+            if eager:
+                failures.append(f"{target} imports {', '.join(eager)} eagerly; import it on first use")
+            if options["budget_ms"] is not None and total > options["budget_ms"]:
+                failures.append(f"{target} takes {total:.0f} ms, over the {options['budget_ms']:.0f} ms budget")
+
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("\nImport budget OK"))
@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from quotes import archive, search, services
+from quotes.models import ArchivedDocument, Quote
+
+
+def index_quote(quote_id, generate):
+    # Runs in a worker process: index the latest archived document of a
+    # quote, or regenerate it when asked to. Returns "indexed", "skipped" or
+    # an error message.
+    try:
+        quote = Quote.objects.select_related("client").get(id=quote_id)
+        document = ArchivedDocument.objects.filter(quote_id=quote_id).order_by("-created_at").first()
+        if document is not None:
+            search.index_document(quote, archive.open_document(document, touch=False))
+        elif generate:
+            # Also indexes it; the quote is not marked as generated (sent)
+            services.render_document(quote)
+        else:
+            return "skipped"
+        return "indexed"
+    except Exception as exc:
+        return f"{type(exc).__name__}: {exc}"
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Index the text of generated quote documents for full-text search. "
+        "New documents are indexed when generated; this backfills the rest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Worker processes (default 4).")
+        parser.add_argument("--reindex", action="store_true", help="Also reindex quotes that already have an entry.")
+        parser.add_argument("--generate", action="store_true",
+                            help="Generate (and archive) the document of quotes that have none.")
+
+    def handle(self, *args, **options):
+        quotes = Quote.objects.order_by("id")
+        if not options["reindex"]:
+            quotes = quotes.filter(search_entry__isnull=True)
+        quote_ids = list(quotes.values_list("id", flat=True))
+        if not quote_ids:
+            self.stdout.write("Nothing to index.")
+            return
+
+        # Workers open their own connections; don't share ours across fork()
+        connections.close_all()
+        counts = {"indexed": 0, "skipped": 0, "failed": 0}
+        workers = max(1, options["workers"])
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            results = pool.map(index_quote, quote_ids, [options["generate"]] * len(quote_ids), chunksize=20)
+            for quote_id, result in zip(quote_ids, results):
+                if result in counts:
+                    counts[result] += 1
+                else:
+                    counts["failed"] += 1
+                    self.stderr.write(f"Quote {quote_id}: {result}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {counts['indexed']} quotes with {workers} workers "
+                f"({counts['skipped']} without document, {counts['failed']} failed)"
+            )
+        )
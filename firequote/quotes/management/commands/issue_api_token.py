@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.models import Tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Issue a new JSON API token for a tenant (replacing its previous one) and print it. "
+        "Only a digest is stored: the token cannot be shown again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug", help="Slug of the tenant.")
+        parser.add_argument("--revoke", action="store_true", help="Remove the tenant's token (disables its API).")
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(slug=options["slug"])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"Unknown tenant: {options['slug']}")
+
+        if options["revoke"]:
+            tenant.api_token_digest = ""
+            tenant.save(update_fields=["api_token_digest"])
+            self.stdout.write(self.style.SUCCESS(f"API token of {tenant.slug} revoked"))
+            return
+
+        token = tenant.set_api_token()
+        tenant.save(update_fields=["api_token_digest"])
+        self.stdout.write(token)
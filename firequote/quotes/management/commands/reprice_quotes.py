@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quotes import pricing
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-price every open quote (document never generated, not priced by hand) "
+        "with the current rate bands. Editing bands in the admin already does this; "
+        "run it after loading or bulk-updating rates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report how many quotes would change.")
+
+    def handle(self, *args, **options):
+        pricing.invalidate_rates()
+        start = time.perf_counter()
+        checked, changed = pricing.reprice_open_quotes(dry_run=options["dry_run"])
+        elapsed = time.perf_counter() - start
+
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{changed} of {checked} open quotes re-priced in {elapsed * 1000:.0f} ms"
+        ))
@@ -0,0 +1,39 @@
+import base64
+import hashlib
+import os
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.static_assets import ASSETS, BOOTSTRAP_VERSION, CDN_URL, STATIC_PREFIX
+
+TARGET_DIR = os.path.join(settings.BASE_DIR, "quotes", "static", *STATIC_PREFIX.strip("/").split("/"))
+
+
+def sri_hash(content):
+    return "sha384-" + base64.b64encode(hashlib.sha384(content).digest()).decode()
+
+
+class Command(BaseCommand):
+    help = (
+        "Download the pinned Bootstrap release into quotes/static so pages work "
+        "without Internet access. Run once from a connected machine and commit the files; "
+        "the quote pages use them instead of the CDN as soon as they are there."
+    )
+
+    def handle(self, *args, **options):
+        for relative_path, expected in ASSETS.items():
+            with urlopen(CDN_URL + relative_path, timeout=30) as response:
+                content = response.read()
+
+            if sri_hash(content) != expected:
+                raise CommandError(f"Integrity check failed for {relative_path}")
+
+            target = os.path.join(TARGET_DIR, relative_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(content)
+            self.stdout.write(f"{relative_path}: {len(content)} bytes")
+
+        self.stdout.write(self.style.SUCCESS(f"Bootstrap {BOOTSTRAP_VERSION} vendored in {TARGET_DIR}"))
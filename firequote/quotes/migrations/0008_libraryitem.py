@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0007_rename_default_selected_norm_is_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('requirements', 'Requerimientos adicionales'), ('detection', 'Detección de incendios'), ('protection', 'Protección contra incendios'), ('human_safety', 'Seguridad humana')], max_length=20)),
+                ('text', models.TextField()),
+                ('normalized', models.TextField()),
+                ('usage_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('section', 'normalized'), name='unique_library_item')],
+            },
+        ),
+    ]
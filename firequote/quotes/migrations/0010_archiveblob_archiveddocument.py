@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0009_quote_updated_at_client_updated_at_norm_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('size', models.PositiveIntegerField()),
+                ('stored_size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('digest', models.CharField(max_length=64)),
+                ('size', models.PositiveIntegerField()),
+                ('manifest', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed_at', models.DateTimeField(auto_now_add=True)),
+                ('blobs', models.ManyToManyField(related_name='documents', to='quotes.archiveblob')),
+                ('quote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_documents', to='quotes.quote')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['quote', '-created_at'], name='archive_quote_latest_idx')],
+            },
+        ),
+    ]
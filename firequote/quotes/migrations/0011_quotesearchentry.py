@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0010_archiveblob_archiveddocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuoteSearchEntry',
+            fields=[
+                ('quote', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='quotes.quote')),
+                ('content', models.TextField()),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='quote_search_vector_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+def keep_existing_values(apps, schema_editor):
+    # Quotes priced by hand before the pricing engine existed keep their values
+    Quote = apps.get_model('quotes', 'Quote')
+    Quote.objects.exclude(
+        value_protection=0, value_detection=0, value_human_safety=0, total_value=0
+    ).update(manual_pricing=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0011_quotesearchentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quote',
+            name='manual_pricing',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RateBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(choices=[('detection', 'Detección de incendios'), ('protection', 'Protección contra incendios'), ('human_safety', 'Seguridad humana')], max_length=20)),
+                ('building_type', models.CharField(blank=True, choices=[('residential', 'Residencial'), ('commercial', 'Comercial')], max_length=20)),
+                ('min_area', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('rate_per_sqm', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('minimum_fee', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['service', 'building_type', 'min_area'],
+                'constraints': [models.UniqueConstraint(fields=('service', 'building_type', 'min_area'), name='unique_rate_band')],
+            },
+        ),
+        migrations.RunPython(keep_existing_values, migrations.RunPython.noop),
+    ]
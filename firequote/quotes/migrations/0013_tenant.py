@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+SCOPED_MODELS = ('Client', 'Norm', 'TemplateDoc', 'Quote', 'LibraryItem')
+
+
+def assign_default_tenant(apps, schema_editor):
+    # Everything created before multi-tenancy belongs to the default tenant
+    Tenant = apps.get_model('quotes', 'Tenant')
+    tenant, _ = Tenant.objects.get_or_create(slug=settings.FIREQUOTE_DEFAULT_TENANT, defaults={'name': 'Principal'})
+    for model_name in SCOPED_MODELS:
+        apps.get_model('quotes', model_name).objects.filter(tenant__isnull=True).update(tenant=tenant)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0012_rateband_quote_manual_pricing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tenant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('domain', models.CharField(blank=True, max_length=253, null=True, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='clients', to='quotes.tenant'),
+        ),
+        migrations.AddField(
+            model_name='norm',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='norms', to='quotes.tenant'),
+        ),
+        migrations.AddField(
+            model_name='templatedoc',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='template_docs', to='quotes.tenant'),
+        ),
+        migrations.AddField(
+            model_name='quote',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='quotes', to='quotes.tenant'),
+        ),
+        migrations.AddField(
+            model_name='libraryitem',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='library_items', to='quotes.tenant'),
+        ),
+        migrations.RunPython(assign_default_tenant, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0013_tenant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='client',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='clients', to='quotes.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='norm',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='norms', to='quotes.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='templatedoc',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='template_docs', to='quotes.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='quote',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='quotes', to='quotes.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='libraryitem',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='library_items', to='quotes.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='norm',
+            name='code',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='norm',
+            constraint=models.UniqueConstraint(fields=('tenant', 'code'), name='unique_norm_code_per_tenant'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='libraryitem',
+            name='unique_library_item',
+        ),
+        migrations.AddConstraint(
+            model_name='libraryitem',
+            constraint=models.UniqueConstraint(fields=('tenant', 'section', 'normalized'), name='unique_library_item_per_tenant'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['tenant', 'full_name'], name='client_tenant_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='templatedoc',
+            index=models.Index(fields=['tenant', 'name'], name='templatedoc_tenant_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(fields=['tenant', '-created_at'], name='quote_tenant_created_idx'),
+        ),
+    ]
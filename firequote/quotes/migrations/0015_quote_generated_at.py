@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 20:10
+
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def mark_generated_quotes(apps, schema_editor):
+    # Quotes with an archived document were generated when the first one was created
+    Quote = apps.get_model('quotes', 'Quote')
+    ArchivedDocument = apps.get_model('quotes', 'ArchivedDocument')
+    first_document = (
+        ArchivedDocument.objects.filter(quote=OuterRef('pk'))
+        .values('quote')
+        .annotate(first=Min('created_at'))
+        .values('first')
+    )
+    Quote.objects.filter(pk__in=ArchivedDocument.objects.values('quote')).update(
+        generated_at=Subquery(first_document)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0014_tenant_required_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quote',
+            name='generated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(mark_generated_quotes, migrations.RunPython.noop),
+    ]
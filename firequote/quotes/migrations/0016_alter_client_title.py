@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0015_quote_generated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='client',
+            name='title',
+            field=models.CharField(blank=True, choices=[('ingeniero', 'Ingeniero(a)'), ('ingeniera', 'Ingeniera'), ('arquitecto', 'Arquitecto(a)'), ('arquitecta', 'Arquitecta'), ('senior', 'Señor(a)'), ('seniora', 'Señora')], max_length=20),
+        ),
+    ]
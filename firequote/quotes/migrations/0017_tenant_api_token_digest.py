@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 23:05
+
+import hashlib
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def keep_global_token(apps, schema_editor):
+    # The token of the former FIREQUOTE_API_TOKEN setting keeps working for the default tenant
+    token = os.environ.get('FIREQUOTE_API_TOKEN', '')
+    if token:
+        Tenant = apps.get_model('quotes', 'Tenant')
+        Tenant.objects.filter(slug=settings.FIREQUOTE_DEFAULT_TENANT).update(
+            api_token_digest=hashlib.sha256(token.encode()).hexdigest()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0016_alter_client_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='api_token_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(keep_global_token, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,20 @@
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 TITLE_CHOICES = [
     ('ingeniero', 'Ingeniero(a)'),
+    ('ingeniera', 'Ingeniera'),
     ('arquitecto', 'Arquitecto(a)'),
+    ('arquitecta', 'Arquitecta'),
     ('senior', 'Señor(a)'),
+    ('seniora', 'Señora'),
 ]
 
 TIME_UNIT_CHOICES = [
@@ -18,8 +28,48 @@ BUILDING_TYPE = [
     ('commercial', 'Comercial'),
 ]
 
+class Tenant(models.Model):
+    # An engineering office: its own clients, quotes, norms and Word templates.
+    slug = models.SlugField(max_length=50, unique=True)  # Also the folder of its templates in templates_docs/
+    name = models.CharField(max_length=200)
+    domain = models.CharField(max_length=253, unique=True, null=True, blank=True)  # Host name serving this tenant
+    api_token_digest = models.CharField(max_length=64, blank=True, editable=False)  # sha256 of its JSON API token; blank: API disabled
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def token_digest(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def set_api_token(self):
+        # New random API token for the office; only its digest is stored, so it is shown once
+        token = secrets.token_urlsafe(32)
+        self.api_token_digest = self.token_digest(token)
+        return token
+
+def default_tenant_id():
+    # Id of the default tenant, created on first use (see tenants.get_default_tenant)
+    tenant, _ = Tenant.objects.get_or_create(slug=settings.FIREQUOTE_DEFAULT_TENANT, defaults={'name': 'Principal'})
+    return tenant.pk
+
+class TenantQuerySet(models.QuerySet):
+    def for_tenant(self, tenant):
+        # Rows of one tenant (instance or id); every tenant-facing query starts here
+        return self.filter(tenant=tenant)
+
+TenantManager = models.Manager.from_queryset(TenantQuerySet)
+
+def tenant_field(related_name):
+    # Tenant FK of scoped models; required, without a default, so a write that
+    # forgot its tenant fails instead of landing in the default office. Not
+    # indexed on its own: every model has a tenant-leading composite index.
+    return models.ForeignKey(Tenant, on_delete=models.PROTECT, related_name=related_name, db_index=False)
+
 class Client(models.Model):
     # Stores client contact and company information.
+    tenant = tenant_field('clients')
     title = models.CharField(max_length=20, choices=TITLE_CHOICES, blank=True)
     full_name = models.CharField(max_length=200, blank=True)
     position = models.CharField(max_length=200, blank=True)
@@ -28,6 +78,14 @@ class Client(models.Model):
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=50, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Version stamp for HTTP caching
+
+    objects = TenantManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'full_name'], name='client_tenant_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.full_name} — {self.company}"
@@ -40,27 +98,45 @@ class Norm(models.Model):
         ('human_safety', 'Seguridad humana'),
     ]
 
-    code = models.CharField(max_length=50, unique=True)  # e.g. "NFPA 13"
+    tenant = tenant_field('norms')
+    code = models.CharField(max_length=50)  # e.g. "NFPA 13", unique per tenant
     description = models.TextField(blank=True)  # e.g. "Standard for automatic sprinkler systems"
     services = models.JSONField(default=list, blank=True)  # Services where the norm applies
     is_default = models.BooleanField(default=False)  # Used as default in templates
+    updated_at = models.DateTimeField(auto_now=True)  # Version stamp of the norm catalog
+
+    objects = TenantManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'code'], name='unique_norm_code_per_tenant'),
+        ]
 
     def __str__(self):
         return f"{self.code} — {self.description}"
 
 class TemplateDoc(models.Model):
     # Represents a .docx template for specific service and delivery format combinations.
+    tenant = tenant_field('template_docs')
     name = models.CharField(max_length=200)  # e.g. "protection_autocad.docx"
     file = models.FileField(upload_to='templates_docs/')
     services_tag = models.CharField(max_length=100)  # e.g. "protection|detection"
     formats_tag = models.CharField(max_length=50)  # e.g. "autocad", "revit", "both"
 
+    objects = TenantManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'name'], name='templatedoc_tenant_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 from django.db import models
 
 class Quote(models.Model):
+    tenant = tenant_field('quotes')
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='quotes')
     project_name = models.CharField(max_length=250)
     is_detection = models.BooleanField(default=False)
@@ -76,6 +152,7 @@ class Quote(models.Model):
     manual_items_sh = models.TextField(blank=True)
     manual_items_detection = models.TextField(blank=True)
     manual_items_protection = models.TextField(blank=True)
+    additional_notes = models.JSONField(default=list, blank=True)  # Notes shown at the end of the document
 
     # Payment schedule
     payment_advance = models.DecimalField(max_digits=5, decimal_places=2, default=40.00)
@@ -91,18 +168,169 @@ class Quote(models.Model):
     value_detection = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     value_human_safety = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    manual_pricing = models.BooleanField(default=False)  # Values entered by hand: the pricing engine leaves them alone
 
     # Related template and generated document
     template_doc = models.ForeignKey(TemplateDoc, on_delete=models.SET_NULL, null=True, blank=True)
     generated_doc = models.FileField(upload_to='generated_quotes/', null=True, blank=True)
+    generated_at = models.DateTimeField(null=True, blank=True, editable=False)  # First document generated: the quote is no longer open
 
     # Optional field for backward compatibility with views.py
     service_tag = models.CharField(max_length=50, blank=True, null=True)  # <-- agregado
 
-    # Creation timestamp
+    # Creation and last modification timestamps
     created_at = models.DateTimeField(auto_now_add=True)  # puedes usar en lugar de quote_date
+    updated_at = models.DateTimeField(auto_now=True)  # Version stamp for ETag/Last-Modified
 
     norms = models.ManyToManyField('Norm', blank=True)
 
+    objects = TenantManager()
+
+    # Fields read by the pricing engine: saving re-prices the quote only when one of them changed
+    PRICING_INPUTS = ('building_type', 'area_sqm', 'is_detection', 'is_protection', 'is_human_safety', 'manual_pricing')
+    PRICE_FIELDS = ('value_detection', 'value_protection', 'value_human_safety', 'total_value')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', '-created_at'], name='quote_tenant_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.client.full_name} - {self.project_name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        quote = super().from_db(db, field_names, values)
+        quote.remember_pricing()
+        return quote
+
+    def remember_pricing(self, fields=None):
+        # Snapshot of the pricing inputs and values as stored (deferred fields are left out)
+        deferred = self.get_deferred_fields()
+        loaded = getattr(self, '_loaded_pricing', {})
+        for field in self.PRICING_INPUTS + self.PRICE_FIELDS:
+            if field not in deferred and (fields is None or field in fields):
+                loaded[field] = getattr(self, field)
+        self._loaded_pricing = loaded
+
+    def pricing_changed(self):
+        # True for new quotes and when a pricing input differs from the stored one
+        loaded = getattr(self, '_loaded_pricing', None)
+        if self._state.adding or loaded is None:
+            return True
+        return any(field not in loaded or loaded[field] != getattr(self, field) for field in self.PRICING_INPUTS)
+
+    def clean(self):
+        errors = {}
+        # Client and template must belong to the quote's office. Only related
+        # objects already assigned are checked: the services set client_id
+        # after looking the client up with for_tenant() themselves.
+        for field in ('client', 'template_doc'):
+            if self.tenant_id and type(self)._meta.get_field(field).is_cached(self):
+                related = getattr(self, field)
+                if related is not None and related.tenant_id != self.tenant_id:
+                    errors[field] = 'Pertenece a otra oficina.'
+
+        # Values edited by hand would be overwritten by the next re-pricing
+        loaded = getattr(self, '_loaded_pricing', {})
+        edited = [f for f in self.PRICE_FIELDS if f in loaded and loaded[f] != getattr(self, f)]
+        if edited and not self.manual_pricing:
+            for field in edited:
+                errors[field] = 'Los valores se calculan con las tarifas; marca "manual pricing" para editarlos a mano.'
+        if errors:
+            raise ValidationError(errors)
+
+class RateBand(models.Model):
+    # Pricing table row: from `min_area` m² up to the next band of the same
+    # service and building type, a service costs area × rate, at least minimum_fee.
+    SERVICE_CHOICES = [
+        ('detection', 'Detección de incendios'),
+        ('protection', 'Protección contra incendios'),
+        ('human_safety', 'Seguridad humana'),
+    ]
+
+    service = models.CharField(max_length=20, choices=SERVICE_CHOICES)
+    building_type = models.CharField(max_length=20, choices=BUILDING_TYPE, blank=True)  # Blank: any building type
+    min_area = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    rate_per_sqm = models.DecimalField(max_digits=12, decimal_places=2)
+    minimum_fee = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['service', 'building_type', 'min_area']
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'building_type', 'min_area'], name='unique_rate_band'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_service_display()} {self.building_type or '*'} desde {self.min_area} m²"
+
+class LibraryItem(models.Model):
+    # Reusable manual item (requirement or service bullet) mined from saved quotes.
+    SECTION_CHOICES = [
+        ('requirements', 'Requerimientos adicionales'),
+        ('detection', 'Detección de incendios'),
+        ('protection', 'Protección contra incendios'),
+        ('human_safety', 'Seguridad humana'),
+    ]
+
+    tenant = tenant_field('library_items')
+    section = models.CharField(max_length=20, choices=SECTION_CHOICES)
+    text = models.TextField()  # Display text, as first typed by an engineer
+    normalized = models.TextField()  # Lookup key: lowercase, no accents, single spaces
+    usage_count = models.PositiveIntegerField(default=0)  # Number of quotes using the item
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'section', 'normalized'], name='unique_library_item_per_tenant'),
+        ]
+
+    def __str__(self):
+        return f"[{self.section}] {self.text}"
+
+class ArchiveBlob(models.Model):
+    # One distinct zip member (e.g. word/styles.xml) of archived documents, stored once.
+    digest = models.CharField(max_length=64, unique=True)  # sha256 of the uncompressed content
+    size = models.PositiveIntegerField()  # Uncompressed size in bytes
+    stored_size = models.PositiveIntegerField()  # Bytes used in the archive storage
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.digest
+
+class ArchivedDocument(models.Model):
+    # A generated .docx, stored as a manifest of deduplicated zip members.
+    quote = models.ForeignKey(Quote, on_delete=models.CASCADE, related_name='archived_documents')
+    filename = models.CharField(max_length=255)
+    digest = models.CharField(max_length=64)  # sha256 of the whole .docx
+    size = models.PositiveIntegerField()  # Size of the .docx in bytes
+    manifest = models.JSONField(default=list)  # [{"name", "blob", "compress_type", "date_time"}] in zip order
+    blobs = models.ManyToManyField(ArchiveBlob, related_name='documents')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['quote', '-created_at'], name='archive_quote_latest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.created_at:%Y-%m-%d})"
+
+class QuoteSearchEntry(models.Model):
+    # Final text of a quote's generated document, indexed for full-text search.
+    quote = models.OneToOneField(Quote, on_delete=models.CASCADE, primary_key=True, related_name='search_entry')
+    content = models.TextField()  # Plain text extracted from the rendered .docx
+    search_vector = SearchVectorField(null=True)  # to_tsvector('spanish', content)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='quote_search_vector_idx'),
+        ]
+
+    def __str__(self):
+        return f"Índice de {self.quote}"
@@ -0,0 +1,60 @@
+"""
+quotes/norm_catalog.py
+----------------------
+Version stamp of the reference norm catalog of each tenant, used to build
+ETags of pages and documents that list norms. With a shared cache the stamp
+is cached and invalidated whenever a Norm is saved or deleted (see
+signals.py); with a per-process cache (locmem) other workers would not see
+the invalidation, so it is read from the database every time.
+
+The catalog itself is small and read on every quote page, so each process
+keeps it in memory and reloads it when the stamp changes.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import Norm
+
+VERSION_CACHE_KEY = "norm_catalog_version"
+
+# Bounds staleness after bulk updates, which do not send signals
+VERSION_CACHE_TIMEOUT = 300
+
+# tenant id -> (version, norms ordered by code) of this process
+_norms = {}
+
+
+def version_cache_key(tenant_id):
+    return f"{VERSION_CACHE_KEY}:{tenant_id}"
+
+
+def compute_version(tenant_id):
+    agg = Norm.objects.for_tenant(tenant_id).aggregate(count=Count("id"), last=Max("updated_at"))
+    last = agg["last"]
+    return f"{agg['count']}-{last.timestamp() if last else 0}", last
+
+
+def catalog_version(tenant_id):
+    # Returns (version string, last modification datetime or None)
+    if not settings.FIREQUOTE_SHARED_CACHE:
+        return compute_version(tenant_id)
+    stamp = cache.get(version_cache_key(tenant_id))
+    if stamp is None:
+        stamp = compute_version(tenant_id)
+        cache.set(version_cache_key(tenant_id), stamp, VERSION_CACHE_TIMEOUT)
+    return stamp
+
+
+def invalidate_catalog(tenant_id):
+    cache.delete(version_cache_key(tenant_id))
+
+
+def get_norms(tenant_id):
+    # All norms of a tenant ordered by code; shared read-only instances, do not modify them
+    version, _ = catalog_version(tenant_id)
+    cached = _norms.get(tenant_id)
+    if cached is None or cached[0] != version:
+        cached = _norms[tenant_id] = (version, tuple(Norm.objects.for_tenant(tenant_id).order_by("code")))
+    return cached[1]
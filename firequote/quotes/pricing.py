@@ -0,0 +1,239 @@
+"""
+quotes/pricing.py
+-----------------
+Table-driven pricing of quotes from their area, building type and services.
+
+Rates live in RateBand rows. The table is loaded once per process into
+sorted arrays per (service, building type) and looked up with bisect; a
+version stamp tells every process when to reload it. The stamp is cached
+and invalidated by signals.py when a band changes if the cache is shared,
+otherwise (locmem) read from the database on each lookup.
+
+For each selected service, the band is the last one whose min_area is not
+above the quote's area:
+
+    value = max(area × rate_per_sqm, minimum_fee)
+
+Bands with a blank building type apply to building types without bands of
+their own. Amounts are computed in integer cents (rounding half up), so the
+single-quote path and the NumPy re-pricing give identical results.
+
+Quotes are priced when created and when their area, building type or
+services change (see signals.py), unless manual_pricing is set;
+reprice_open_quotes() re-prices every quote not yet generated after a rate
+change. Amounts beyond int64 are computed with Python ints on both paths.
+"""
+
+import threading
+from bisect import bisect_right
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Quote, RateBand
+
+# RateBand.service -> (Quote service flag, Quote value field)
+SERVICE_FIELDS = {
+    "detection": ("is_detection", "value_detection"),
+    "protection": ("is_protection", "value_protection"),
+    "human_safety": ("is_human_safety", "value_human_safety"),
+}
+
+PRICE_FIELDS = [value_field for _, value_field in SERVICE_FIELDS.values()] + ["total_value"]
+
+VERSION_CACHE_KEY = "rate_table_version"
+
+INT64_MAX = 2**63 - 1
+
+# Bounds staleness after bulk updates, which do not send signals
+VERSION_CACHE_TIMEOUT = 300
+
+
+def to_cents(amount):
+    return int((Decimal(amount) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def band_value(area_cents, rate_cents, fee_cents):
+    # Cents of area × rate (area and rate both in hundredths), at least the fee
+    return max((area_cents * rate_cents + 50) // 100, fee_cents)
+
+
+class RateTable:
+    def __init__(self, version, bands):
+        self.version = version
+        # (service, building_type) -> (min areas, rates, minimum fees) in cents, by min area
+        self.bands = {}
+        for band in sorted(bands, key=lambda b: b[2]):
+            service, building_type, min_area, rate, fee = band
+            mins, rates, fees = self.bands.setdefault((service, building_type), ([], [], []))
+            mins.append(to_cents(min_area))
+            rates.append(to_cents(rate))
+            fees.append(to_cents(fee))
+        self._arrays = {}
+
+    def lookup(self, service, building_type):
+        return self.bands.get((service, building_type)) or self.bands.get((service, ""))
+
+    def value_cents(self, service, building_type, area_cents):
+        bands = self.lookup(service, building_type)
+        if bands is None:
+            return 0
+        mins, rates, fees = bands
+        index = bisect_right(mins, area_cents) - 1
+        if index < 0:
+            return 0  # Smaller than the first band
+        return band_value(area_cents, rates[index], fees[index])
+
+    def arrays(self, service, building_type):
+        # The same bands as NumPy int64 arrays, built on first use
+        key = (service, building_type)
+        if key not in self._arrays:
+            import numpy as np
+
+            bands = self.lookup(service, building_type)
+            self._arrays[key] = tuple(np.array(b, dtype=np.int64) for b in bands) if bands else None
+        return self._arrays[key]
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def compute_version():
+    agg = RateBand.objects.aggregate(count=Count("id"), last=Max("updated_at"))
+    return f"{agg['count']}-{agg['last'].timestamp() if agg['last'] else 0}"
+
+
+def rates_version():
+    if not settings.FIREQUOTE_SHARED_CACHE:
+        return compute_version()
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = compute_version()
+        cache.set(VERSION_CACHE_KEY, version, VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def invalidate_rates():
+    cache.delete(VERSION_CACHE_KEY)
+
+
+def get_rate_table():
+    global _table
+    version = rates_version()
+    table = _table
+    if table is None or table.version != version:
+        with _table_lock:
+            if _table is None or _table.version != version:
+                bands = RateBand.objects.values_list(
+                    "service", "building_type", "min_area", "rate_per_sqm", "minimum_fee"
+                )
+                _table = RateTable(version, list(bands))
+            table = _table
+    return table
+
+
+def price_quote(quote, table=None):
+    # Set the service values and total of a quote (unsaved); False if it is priced by hand
+    if quote.manual_pricing:
+        return False
+    table = table or get_rate_table()
+    area_cents = to_cents(quote.area_sqm) if quote.area_sqm is not None else None
+    total = 0
+    for service, (flag, value_field) in SERVICE_FIELDS.items():
+        cents = 0
+        if getattr(quote, flag) and area_cents is not None:
+            cents = table.value_cents(service, quote.building_type, area_cents)
+        setattr(quote, value_field, from_cents(cents))
+        total += cents
+    quote.total_value = from_cents(total)
+    return True
+
+
+def open_quotes():
+    # Quotes whose document was never generated (nothing sent to the client yet);
+    # generated_at stays set when compaction drops the archived documents
+    return Quote.objects.filter(manual_pricing=False, generated_at__isnull=True)
+
+
+def price_rows(table, building_types, area, selected):
+    """
+    Cents of every service and the total (one row per quote, PRICE_FIELDS
+    order) for arrays of building types, areas in cents (-1 when unknown)
+    and selected services ({service: bool array}).
+    """
+    import numpy as np
+
+    types = np.asarray(building_types, dtype=object)
+    values = np.zeros((len(area), len(PRICE_FIELDS)), dtype=np.int64)
+    for col, service in enumerate(SERVICE_FIELDS):
+        for building_type in set(types):
+            bands = table.arrays(service, building_type)
+            mask = selected[service] & (types == building_type) & (area >= 0)
+            if bands is None or not mask.any():
+                continue
+            mins, rates, fees = bands
+            quote_area = area[mask]
+            index = np.searchsorted(mins, quote_area, side="right") - 1
+            in_band = index >= 0
+            index = np.where(in_band, index, 0)
+            rate = rates[index]
+            if int(quote_area.max()) * int(rate.max()) > INT64_MAX - 50:
+                # area × rate would wrap around in int64: use Python ints, as
+                # price_quote() does (the values then no longer fit the fields)
+                quote_area, rate, values = quote_area.astype(object), rate.astype(object), values.astype(object)
+            priced = np.maximum((quote_area * rate + 50) // 100, fees[index])
+            values[mask, col] = np.where(in_band, priced, 0)
+    values[:, -1] = values[:, :-1].sum(axis=1)
+    return values
+
+
+def reprice_open_quotes(dry_run=False):
+    """
+    Re-price every open quote with the current rates, vectorized with NumPy
+    (one searchsorted per service and building type). Only quotes whose
+    values change are written. Returns (quotes checked, quotes changed).
+    """
+    import numpy as np
+
+    table = get_rate_table()
+    flags = [flag for flag, _ in SERVICE_FIELDS.values()]
+    with transaction.atomic():
+        rows = list(
+            open_quotes().select_for_update(of=("self",)).values_list(
+                "id", "tenant_id", "building_type", "area_sqm", *flags, *PRICE_FIELDS
+            )
+        )
+        if not rows:
+            return 0, 0
+
+        ids, tenant_ids, types, areas, *columns = zip(*rows)
+        area = np.array([to_cents(a) if a is not None else -1 for a in areas], dtype=np.int64)
+        selected = {service: np.array(columns[i], dtype=bool) for i, service in enumerate(SERVICE_FIELDS)}
+        current = np.array(
+            [[to_cents(v) for v in column] for column in columns[len(flags):]], dtype=np.int64
+        ).T
+        values = price_rows(table, types, area, selected)
+
+        changed = np.flatnonzero((values != current).any(axis=1))
+        if dry_run or not len(changed):
+            return len(rows), len(changed)
+
+        now = timezone.now()
+        updates = []
+        for row in changed:
+            quote = Quote(id=ids[row], tenant_id=tenant_ids[row], updated_at=now)
+            for col, field in enumerate(PRICE_FIELDS):
+                setattr(quote, field, from_cents(values[row, col]))
+            updates.append(quote)
+        # bulk_update skips auto_now: bump updated_at so ETags of the quote change
+        Quote.objects.bulk_update(updates, PRICE_FIELDS + ["updated_at"], batch_size=500)
+    return len(rows), len(changed)
@@ -0,0 +1,125 @@
+"""
+quotes/search.py
+----------------
+Full-text search over the final text of generated quote documents.
+
+The text is extracted from the rendered .docx when it is generated
+(services.render_document) and stored in QuoteSearchEntry, whose
+search_vector column (Spanish dictionary, GIN index) is what queries hit.
+Quotes generated before this existed are indexed with
+`python manage.py index_quotes`.
+"""
+
+import io
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.utils.html import escape
+
+from .models import QuoteSearchEntry
+
+SEARCH_CONFIG = "spanish"
+
+# Parts of the .docx whose text is indexed, in reading order
+TEXT_PART_RE = re.compile(r"^word/(header\d*|document|footer\d*)\.xml$")
+TEXT_PART_ORDER = {"header": 0, "document": 1, "footer": 2}
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+# Highlight markers put around matches by PostgreSQL; replaced by <mark>
+# after escaping, since the indexed text is user content
+START_MARK = "\x02"
+STOP_MARK = "\x03"
+
+
+def part_order(name):
+    kind = re.match(r"word/([a-z]+)", name).group(1)
+    return TEXT_PART_ORDER[kind], name
+
+
+def paragraphs(node):
+    # Text of every paragraph under node, text boxes included. A text box
+    # paragraph is reported on its own, not as part of the paragraph holding
+    # it, and the legacy copy Word keeps of it (mc:Fallback) is skipped.
+    if node.tag == W + "p":
+        text = []
+        yield from paragraph_runs(node, text)
+        yield "".join(text).strip()
+        return
+    for child in node:
+        if child.tag != MC_FALLBACK:
+            yield from paragraphs(child)
+
+
+def paragraph_runs(node, text):
+    for child in node:
+        if child.tag == W + "t" and child.text:
+            text.append(child.text)
+        elif child.tag in (W + "tab", W + "br", W + "cr"):
+            text.append(" ")
+        elif child.tag == W + "p":
+            yield from paragraphs(child)
+        elif child.tag != MC_FALLBACK:
+            yield from paragraph_runs(child, text)
+
+
+def extract_text(content):
+    # Plain text of a .docx (bytes): one line per non-empty paragraph;
+    # headers/footers repeated across sections are kept once
+    lines = []
+    seen = set()
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        names = sorted((n for n in zf.namelist() if TEXT_PART_RE.match(n)), key=part_order)
+        for name in names:
+            is_body = name == "word/document.xml"
+            for text in paragraphs(ElementTree.fromstring(zf.read(name))):
+                if text and (is_body or text not in seen):
+                    seen.add(text)
+                    lines.append(text)
+    return "\n".join(lines)
+
+
+def index_document(quote, content):
+    # Store the text of a generated document (bytes) as the quote's search entry
+    QuoteSearchEntry.objects.update_or_create(quote=quote, defaults={"content": extract_text(content)})
+    QuoteSearchEntry.objects.filter(quote=quote).update(
+        search_vector=SearchVector("content", config=SEARCH_CONFIG)
+    )
+
+
+def highlight(headline):
+    return escape(headline).replace(START_MARK, "<mark>").replace(STOP_MARK, "</mark>")
+
+
+def search_quotes(tenant, text, limit=50):
+    """
+    Quotes of a tenant whose document matches `text` (web-search syntax:
+    words, "exact phrases", OR, -excluded), best first. Each result has
+    .rank and .snippet (safe HTML with the matches in <mark>).
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    entries = (
+        QuoteSearchEntry.objects.filter(quote__tenant=tenant, search_vector=query)
+        .select_related("quote__client")
+        .defer("content", "search_vector")
+        .annotate(
+            rank=SearchRank("search_vector", query),
+            headline=SearchHeadline(
+                "content",
+                query,
+                config=SEARCH_CONFIG,
+                start_sel=START_MARK,
+                stop_sel=STOP_MARK,
+                max_fragments=3,
+                fragment_delimiter=" … ",
+            ),
+        )
+        .order_by("-rank", "-indexed_at")[:limit]
+    )
+    results = list(entries)
+    for entry in results:
+        entry.snippet = highlight(entry.headline)
+    return results
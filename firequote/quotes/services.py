@@ -0,0 +1,471 @@
+"""
+quotes/services.py
+------------------
+Quote workflow shared by the HTML views and the JSON API: creating clients
+and quotes (one by one or in batches), updating quote details and
+generating the final Word (.docx) document.
+
+Functions take plain Python values (already extracted from a form or a
+JSON body) and raise ServiceError with a user-facing message when the
+input is invalid.
+"""
+
+import locale
+import os
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import archive, item_library, pricing, search, tenants
+from .docx_engine import render_docx
+from .models import Client, Norm, Quote
+from .norm_catalog import catalog_version
+
+
+class ServiceError(ValueError):
+    # Invalid input; the message is meant to be shown to the user.
+    pass
+
+
+CLIENT_FIELDS = ("title", "full_name", "position", "company", "city", "email", "phone")
+
+SERVICE_FLAGS = ("is_detection", "is_protection", "is_human_safety", "deliver_autocad", "deliver_revit")
+
+# Quote field -> key used by callers for the manual item lists
+MANUAL_ITEM_FIELDS = {
+    "manual_requirements": "client_requirements",
+    "manual_items_sh": "items_human_safety",
+    "manual_items_protection": "items_protection",
+    "manual_items_detection": "items_detection",
+}
+
+PAYMENT_FIELDS = ("payment_advance", "payment_first_version", "payment_final")
+
+# Word templates, one per service/format combination (see get_template_filename).
+# A tenant may override any of them in its own folder, templates_docs/<tenant slug>/.
+TEMPLATES_DOCS_DIR = os.path.join(settings.BASE_DIR, "quotes", "templates_docs")
+
+
+# Utility: converts multiline text input into a clean list of items
+def parse_items(text):
+    if not text:
+        return []
+    return [i.strip() for i in text.split("\n") if i.strip()]
+
+
+# Utility: accepts a list of items or a multiline string
+def as_items(value):
+    if isinstance(value, (list, tuple)):
+        return [str(i).strip() for i in value if str(i).strip()]
+    return parse_items(value)
+
+
+# Utility: int from a form/JSON value, or the given default when not a whole number
+def to_int(value, default):
+    return int(value) if str(value).isdigit() else default
+
+
+# Utility: non-negative Decimal (2 places, decimal comma accepted) from a form/JSON value, or the default
+def to_decimal(value, default, max_digits=10):
+    try:
+        number = Decimal(str(value).strip().replace(",", ".")).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return default
+    return number if number.is_finite() and 0 <= number < 10 ** (max_digits - 2) else default
+
+
+# Utility: list of norm IDs from a form/JSON value (None when absent); ServiceError otherwise
+def to_id_list(value):
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)) or not all(
+        (isinstance(i, int) and not isinstance(i, bool)) or (isinstance(i, str) and i.isdigit())
+        for i in value
+    ):
+        raise ServiceError("Las normas deben ser una lista de IDs numéricos.")
+    return [int(i) for i in value]
+
+
+# Run the model validation (lengths, choices, email...) of an unsaved or
+# modified instance and report failures as a ServiceError. Relations and
+# uniqueness are checked by the callers, scoped to the tenant.
+def validate(instance, exclude=()):
+    try:
+        instance.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+    except ValidationError as exc:
+        errors = "; ".join(f"{field}: {' '.join(messages)}" for field, messages in exc.message_dict.items())
+        raise ServiceError(f"Datos no válidos ({errors})") from exc
+
+
+# Normalize checkbox input (HTML sends "on"/"true"/None inconsistently)
+def str2bool(v):
+    return str(v).lower() in ("true", "1", "yes", "on")
+
+
+# Determine the correct .docx template based on selected services and delivery formats
+def get_template_filename(is_detection, is_protection, is_human_safety, deliver_autocad, deliver_revit):
+    # Determine base name based on service combination
+    if is_detection and is_protection and is_human_safety:
+        base_name = "detection_protection_human_safety"
+    elif is_detection and is_protection:
+        base_name = "detection_protection"
+    elif is_detection and is_human_safety:
+        base_name = "detection_human_safety"
+    elif is_protection and is_human_safety:
+        base_name = "protection_human_safety"
+    elif is_detection:
+        base_name = "detection"
+    elif is_protection:
+        base_name = "protection"
+    elif is_human_safety:
+        base_name = "human_safety"
+    else:
+        return None
+
+    # Determine suffix based on delivery format (AutoCAD/Revit)
+    if deliver_autocad and deliver_revit:
+        suffix = "_both"
+    elif deliver_autocad:
+        suffix = "_autocad"
+    elif deliver_revit:
+        suffix = "_revit"
+    else:
+        suffix = ""
+
+    filename = f"{base_name}{suffix}.docx"
+    return filename
+
+
+# Resolve the .docx template path of a quote, or None if it has no services selected
+def get_template_path(quote):
+    template_filename = get_template_filename(
+        is_detection=quote.is_detection,
+        is_protection=quote.is_protection,
+        is_human_safety=quote.is_human_safety,
+        deliver_autocad=quote.deliver_autocad,
+        deliver_revit=quote.deliver_revit
+    )
+    if not template_filename:
+        return None
+    return template_source(tenants.get_tenant(quote.tenant_id), template_filename)[0]
+
+
+def template_source(tenant, template_filename):
+    """
+    (path, template cache namespace) of a template for a tenant: its own copy
+    in templates_docs/<slug>/ when it has one, otherwise the shared template
+    (namespace "", so shared templates are compiled once for all tenants).
+    """
+    own_path = os.path.join(TEMPLATES_DOCS_DIR, tenant.slug, template_filename)
+    if os.path.exists(own_path):
+        return own_path, tenant.slug
+    return os.path.join(TEMPLATES_DOCS_DIR, template_filename), ""
+
+
+# ---------------------------------------------------------------------------
+# Clients and quotes
+# ---------------------------------------------------------------------------
+
+def build_client(data, tenant):
+    # Unsaved Client of a tenant from a dict; a new client needs at least a name and a company
+    if not data.get("full_name") or not data.get("company"):
+        raise ServiceError("El cliente nuevo necesita nombre completo y empresa.")
+    client = Client(tenant=tenant, **{field: str(data.get(field) or "") for field in CLIENT_FIELDS})
+    validate(client, exclude=["tenant"])
+    return client
+
+
+def create_client(data, tenant):
+    client = build_client(data, tenant)
+    client.save()
+    return client
+
+
+def create_clients(batch, tenant):
+    clients = [build_client(data, tenant) for data in batch]
+    return Client.objects.bulk_create(clients)
+
+
+def build_quote(data, tenant):
+    """
+    Unsaved Quote of a tenant from a dict with the quote_form fields (client_id,
+    project_name, service flags...) plus, optionally, the quote_details
+    ones (manual item lists, additional_notes, payments, delivery time).
+    """
+    client_id = to_int(data.get("client_id"), None)
+    if not client_id or not data.get("project_name"):
+        raise ServiceError("Por favor completa todos los campos obligatorios.")
+
+    quote = Quote(
+        tenant=tenant,
+        client_id=client_id,
+        project_name=str(data["project_name"]),
+        service_tag=data.get("service_tag") or "default",
+        building_type=data.get("building_type") or "",
+        area_sqm=to_decimal(data.get("area_sqm"), None),
+        delivery_time_value=to_int(data.get("delivery_time_value"), 0),
+        delivery_time_unit=data.get("delivery_time_unit") or "days",
+        additional_notes=as_items(data.get("additional_notes")),
+    )
+    for flag in SERVICE_FLAGS:
+        setattr(quote, flag, str2bool(data.get(flag, False)))
+    for field, key in MANUAL_ITEM_FIELDS.items():
+        setattr(quote, field, "\n".join(as_items(data.get(key))))
+    for field in PAYMENT_FIELDS:
+        setattr(quote, field, to_int(data.get(field), getattr(quote, field)))
+    validate(quote, exclude=["tenant", "client"])
+    return quote
+
+
+def resolve_norm_ids(tenant, norm_ids):
+    # IDs of the tenant's norms among the submitted ones; an empty selection means its default norms
+    norms = Norm.objects.for_tenant(tenant)
+    norm_ids = to_id_list(norm_ids)
+    if norm_ids:
+        return list(norms.filter(id__in=norm_ids).values_list("id", flat=True))
+    return list(norms.filter(is_default=True).values_list("id", flat=True))
+
+
+def create_quote(data, tenant, norm_ids=None):
+    norm_ids = to_id_list(norm_ids)
+    quote = build_quote(data, tenant)
+    if not Client.objects.for_tenant(tenant).filter(id=quote.client_id).exists():
+        raise ServiceError(f"Cliente inexistente: {quote.client_id}")
+
+    with transaction.atomic():
+        quote.save()
+        if norm_ids is not None:
+            quote.norms.set(resolve_norm_ids(tenant, norm_ids))
+        item_library.sync_quote(quote)
+    return quote
+
+
+def create_quotes(batch, tenant):
+    """
+    Create many quotes of a tenant at once with bulk_create. Each entry is a
+    build_quote() dict with an optional "norms" list of norm IDs. Either every
+    quote is created or none (ServiceError mentions the offending entry).
+    """
+    quotes = []
+    norm_lists = []
+    for position, data in enumerate(batch):
+        try:
+            quotes.append(build_quote(data, tenant))
+            norm_lists.append(to_id_list(data.get("norms")) or [])
+        except ServiceError as exc:
+            raise ServiceError(f"Cotización #{position + 1}: {exc}") from exc
+
+    client_ids = {q.client_id for q in quotes}
+    existing = set(Client.objects.for_tenant(tenant).filter(id__in=client_ids).values_list("id", flat=True))
+    missing = client_ids - existing
+    if missing:
+        raise ServiceError(f"Clientes inexistentes: {sorted(missing)}")
+
+    # bulk_create does not send pre_save: price the quotes here
+    rate_table = pricing.get_rate_table()
+    for quote in quotes:
+        pricing.price_quote(quote, rate_table)
+
+    with transaction.atomic():
+        quotes = Quote.objects.bulk_create(quotes)
+
+        # Norm assignments, also in bulk through the M2M table (one catalog query)
+        catalog = dict(Norm.objects.for_tenant(tenant).values_list("id", "is_default"))
+        default_ids = [norm_id for norm_id, is_default in catalog.items() if is_default]
+        links = []
+        for quote, norm_ids in zip(quotes, norm_lists):
+            ids = [norm_id for norm_id in norm_ids if norm_id in catalog]
+            links += [Quote.norms.through(quote_id=quote.id, norm_id=norm_id) for norm_id in ids or default_ids]
+        Quote.norms.through.objects.bulk_create(links)
+
+        item_library.sync_quotes(quotes)
+    return quotes
+
+
+def update_quote_details(quote, details, norm_ids):
+    """
+    Apply the quote_details data to an existing quote: manual item lists,
+    notes, payments, delivery time and (when present) service flags, then
+    replace its reference norms. Raises ServiceError (leaving the stored
+    quote untouched) when the data is not valid.
+    """
+    norm_ids = to_id_list(norm_ids)
+    for flag in SERVICE_FLAGS:
+        if flag in details:
+            setattr(quote, flag, str2bool(details[flag]))
+
+    for field in PAYMENT_FIELDS:
+        setattr(quote, field, to_int(details.get(field, ""), getattr(quote, field)))
+    quote.delivery_time_value = to_int(details.get("delivery_time_value", ""), quote.delivery_time_value)
+    quote.delivery_time_unit = details.get("delivery_time_unit") or quote.delivery_time_unit
+
+    # Persist the manual items and feed them to the reusable item library
+    previous_items = item_library.snapshot(quote)
+    for field, key in MANUAL_ITEM_FIELDS.items():
+        setattr(quote, field, "\n".join(as_items(details.get(key))))
+    quote.additional_notes = as_items(details.get("additional_notes"))
+    validate(quote, exclude=["tenant", "client"])
+
+    with transaction.atomic():
+        # Replace previous norms assigned to this quote
+        quote.norms.set(resolve_norm_ids(quote.tenant_id, norm_ids))
+        quote.save()
+        item_library.sync_quote(quote, previous_items)
+    return quote
+
+
+# ---------------------------------------------------------------------------
+# Document generation
+# ---------------------------------------------------------------------------
+
+# Helpers: format bullet-point text for correct Word rendering
+def format_bullets(items, bullet="-"):
+    # Format a list of items as bullet points with a tab after the bullet. Example: "-\tItem text"
+    if not items:
+        return ""
+    return "\n".join(f"{bullet}\t{i.strip()}" for i in items if i and str(i).strip())
+
+
+def format_bullets_no_tab(items, bullet='-'):
+    # Format a list of items as bullet points without a tab character.
+    if not items:
+        return ""
+    return "\n".join(f"{bullet} {i.strip()}" for i in items if i and str(i).strip())
+
+
+# Format today's date in Spanish (fallback for Windows locale issues)
+def quote_date_es():
+    try:
+        locale.setlocale(locale.LC_TIME, "es_ES.UTF-8")
+    except locale.Error:
+        try:
+            locale.setlocale(locale.LC_TIME, "Spanish_Spain")
+        except locale.Error:
+            meses_es = {
+                "January": "enero", "February": "febrero", "March": "marzo", "April": "abril",
+                "May": "mayo", "June": "junio", "July": "julio", "August": "agosto",
+                "September": "septiembre", "October": "octubre", "November": "noviembre", "December": "diciembre"
+            }
+            fecha_en = datetime.now().strftime("%d de %B de %Y")
+            for en, es in meses_es.items():
+                fecha_en = fecha_en.replace(en, es)
+            return fecha_en
+    return datetime.now().strftime("%d de %B de %Y")
+
+
+# Build the Word template context from the data stored on the quote
+def build_document_context(quote):
+    # Build formatted list of reference norms
+    reference_norms = [f"{n.code} {n.description}".strip() for n in quote.norms.all()]
+
+    # Get display title (Mr./Mrs.) from client model
+    if hasattr(quote.client, "get_title_display"):
+        client_title = quote.client.get_title_display()
+    else:
+        client_title = getattr(quote.client, "title", "") or ""
+
+    return {
+        "quote_date": quote_date_es(),
+        "quote_number": f"COT{quote.id:03d}-25",
+
+        "client_city": getattr(quote.client, "city", "") or "",
+        "client_company": getattr(quote.client, "company", "") or "",
+        "client_title": client_title,
+        "client_name": quote.client.full_name,
+        "client_position": getattr(quote.client, "position", "") or "",
+
+        "project_name": quote.project_name,
+
+        "reference_norms": format_bullets(reference_norms, bullet="•"),  # ← punto
+        "client_requirements": format_bullets(parse_items(quote.manual_requirements)),  # ← guion
+        "items_human_safety": format_bullets(parse_items(quote.manual_items_sh)),
+        "items_protection": format_bullets(parse_items(quote.manual_items_protection)),
+        "items_detection": format_bullets(parse_items(quote.manual_items_detection)),
+        "additional_notes": format_bullets_no_tab(quote.additional_notes, "-"),
+        "payment_schedule": format_bullets_no_tab([
+            f"{quote.payment_advance}% Anticipo",
+            f"{quote.payment_first_version}% Contra entrega de la primera versión del diseño",
+            f"{quote.payment_final}% Contra entrega final del diseño",
+        ], "-"),
+
+        "delivery_time_text": f"{quote.delivery_time_value} {quote.get_delivery_time_unit_display()} a partir del pago del anticipo.",
+
+        "value_protection": getattr(quote, "value_protection", ""),
+        "value_detection": getattr(quote, "value_detection", ""),
+        "value_human_safety": getattr(quote, "value_human_safety", ""),
+        "total_value": getattr(quote, "total_value", ""),
+        "total_value_text": getattr(quote, "total_value_text", ""),
+    }
+
+
+# Download filename of a quote's document
+def document_filename(quote):
+    safe_client_name = "".join(c for c in quote.client.full_name if c.isalnum() or c in (" ", "_")).strip().replace(" ", "_")
+    safe_project = "".join(c for c in quote.project_name if c.isalnum() or c in (" ", "_")).strip().replace(" ", "_")
+    return f"Cotizacion_{safe_client_name}_{safe_project}.docx"
+
+
+# Last modification time of a file as an aware datetime (None if missing)
+def file_modified(path):
+    if not path or not os.path.exists(path):
+        return None
+    return datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc)
+
+
+# Latest change among the inputs of a quote's document
+def document_sources_modified(quote):
+    _, norms_modified = catalog_version(quote.tenant_id)
+    stamps = (quote.updated_at, quote.client.updated_at, norms_modified, file_modified(get_template_path(quote)))
+    return max(d for d in stamps if d is not None)
+
+
+def render_document(quote):
+    """
+    Render the Word document of a quote from its stored data, archive and
+    index it, without changing the quote itself (see generate_document).
+    Returns (filename, content bytes); raises ServiceError if no template applies.
+    """
+    template_filename = get_template_filename(*(getattr(quote, flag) for flag in SERVICE_FLAGS))
+
+    # Validate that a template exists before rendering
+    if not template_filename:
+        raise ServiceError("No se seleccionó ningún servicio, por favor marca al menos uno.")
+    template_path, namespace = template_source(tenants.get_tenant(quote.tenant_id), template_filename)
+    if not os.path.exists(template_path):
+        raise ServiceError(f"No se encontró la plantilla correspondiente: {template_filename}")
+
+    content = render_docx(template_path, build_document_context(quote), namespace)
+    output_filename = document_filename(quote)
+    archive.archive_document(quote, output_filename, content)
+    search.index_document(quote, content)
+    return output_filename, content
+
+
+def generate_document(quote):
+    """
+    Generate the document of a quote for the client: render_document(), then
+    mark the quote as generated. Returns (filename, content bytes).
+    """
+    output_filename, content = render_document(quote)
+    if quote.generated_at is None:
+        # Sent to the client: no longer re-priced (see pricing.open_quotes). A
+        # plain update, so updated_at (and the archived document) stay current
+        quote.generated_at = timezone.now()
+        Quote.objects.filter(pk=quote.pk, generated_at__isnull=True).update(generated_at=quote.generated_at)
+    return output_filename, content
+
+
+def get_document(quote):
+    """
+    Document of a quote for download: the archived one when it is still
+    current, otherwise (never generated, changed since, or dropped by the
+    retention policy) a freshly generated one.
+    """
+    document = archive.current_document(quote.id, document_sources_modified(quote))
+    if document is not None:
+        return document.filename, archive.open_document(document)
+    return generate_document(quote)
@@ -0,0 +1,43 @@
+# quotes/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import pricing, tenants
+from .models import Norm, Quote, RateBand, Tenant
+from .norm_catalog import invalidate_catalog
+
+
+@receiver(post_save, sender=Norm)
+@receiver(post_delete, sender=Norm)
+def norm_changed(sender, instance, **kwargs):
+    # Any change to a tenant's catalog invalidates its cached pages and documents listing norms
+    invalidate_catalog(instance.tenant_id)
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def tenant_changed(sender, **kwargs):
+    # New domains are served right away by this process, others within TENANT_REFRESH_SECONDS
+    tenants.reset_registry()
+
+
+@receiver(post_save, sender=RateBand)
+@receiver(post_delete, sender=RateBand)
+def rates_changed(sender, **kwargs):
+    # Every process reloads its rate table on its next lookup
+    pricing.invalidate_rates()
+
+
+@receiver(pre_save, sender=Quote)
+def price_quote(sender, instance, raw=False, **kwargs):
+    # Fixtures (raw saves) keep the values they carry; saves that leave area,
+    # building type and services alone keep the stored values (rate changes
+    # go through pricing.reprice_open_quotes)
+    if not raw and instance.pricing_changed():
+        pricing.price_quote(instance)
+
+
+@receiver(post_save, sender=Quote)
+def quote_saved(sender, instance, update_fields=None, **kwargs):
+    # The saved values are the new baseline of pricing_changed()
+    instance.remember_pricing(update_fields)
@@ -0,0 +1,52 @@
+"""
+quotes/static_assets.py
+-----------------------
+Pinned front-end assets (Bootstrap) of the quote pages.
+
+They are served from quotes/static once vendored with
+`python manage.py vendor_bootstrap` (and collected with collectstatic), so
+pages work without Internet access. Until the files are there, the same
+pinned release is loaded from the CDN; both are checked with the same
+Subresource Integrity hash.
+"""
+
+import functools
+
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+BOOTSTRAP_VERSION = "5.3.2"
+CDN_URL = f"https://cdn.jsdelivr.net/npm/bootstrap@{BOOTSTRAP_VERSION}/dist/"
+
+# Static path prefix of the vendored release (quotes/static/quotes/vendor/bootstrap/)
+STATIC_PREFIX = "quotes/vendor/bootstrap/"
+
+# Relative path -> Subresource Integrity hash published by Bootstrap
+ASSETS = {
+    "css/bootstrap.min.css": "sha384-T3c6CoIi6uLrA9TneNEoa7RxnatzjcDSCmG1MXxSR1GAsXEV/Dwwykc2MPK8M2HN",
+    "js/bootstrap.bundle.min.js": "sha384-C6RzsynM9kWDrMNeT87bh95OGNyZPhcTNXj1NW7RuBCsyN/o0jlpcV8Qyq46cDfL",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def is_vendored(relative_path):
+    return finders.find(STATIC_PREFIX + relative_path) is not None
+
+
+def asset_url(relative_path):
+    # Local (hashed in production) URL when vendored, the pinned CDN URL otherwise
+    if is_vendored(relative_path):
+        return static(STATIC_PREFIX + relative_path)
+    return CDN_URL + relative_path
+
+
+def asset_tag(relative_path):
+    url = asset_url(relative_path)
+    attrs = format_html(' integrity="{}"', ASSETS[relative_path])
+    if url.startswith(CDN_URL):
+        # Cross-origin files need CORS for the integrity check
+        attrs = format_html('{} crossorigin="anonymous"', attrs)
+    if relative_path.endswith(".css"):
+        return format_html('<link href="{}" rel="stylesheet"{}>', url, attrs)
+    return format_html('<script src="{}"{}></script>', url, attrs)
@@ -0,0 +1,16 @@
+# quotes/templatetags/quote_assets.py
+from django import template
+
+from ..static_assets import asset_tag
+
+register = template.Library()
+
+
+@register.simple_tag
+def bootstrap_css():
+    return asset_tag("css/bootstrap.min.css")
+
+
+@register.simple_tag
+def bootstrap_js():
+    return asset_tag("js/bootstrap.bundle.min.js")
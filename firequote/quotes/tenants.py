@@ -0,0 +1,86 @@
+"""
+quotes/tenants.py
+-----------------
+Tenant (engineering office) resolution.
+
+One deployment serves every office: TenantMiddleware sets request.tenant
+from the request host (Tenant.domain), falling back to the default tenant
+(settings.FIREQUOTE_DEFAULT_TENANT). Views and services then scope every
+query with `Model.objects.for_tenant(...)`.
+
+The tenant table is tiny and read on every request, so each process keeps
+it in memory, reloaded periodically and whenever a Tenant is saved in
+this process (see signals.py).
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.http.request import split_domain_port
+
+from .models import Tenant, default_tenant_id
+
+REFRESH_SECONDS = getattr(settings, "TENANT_REFRESH_SECONDS", 60)
+
+
+class TenantRegistry:
+    def __init__(self):
+        tenants = list(Tenant.objects.all())
+        self.by_id = {t.id: t for t in tenants}
+        self.by_domain = {t.domain.lower(): t for t in tenants if t.domain}
+        self.default = next((t for t in tenants if t.slug == settings.FIREQUOTE_DEFAULT_TENANT), None)
+        self.loaded_at = time.monotonic()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    registry = _registry
+    if registry is None or time.monotonic() - registry.loaded_at > REFRESH_SECONDS:
+        with _registry_lock:
+            if _registry is None or time.monotonic() - _registry.loaded_at > REFRESH_SECONDS:
+                _registry = TenantRegistry()
+            registry = _registry
+    return registry
+
+
+def reset_registry():
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+def get_default_tenant():
+    tenant = get_registry().default
+    if tenant is None:
+        default_tenant_id()  # First run: create it
+        reset_registry()
+        tenant = get_registry().default
+    return tenant
+
+
+def get_tenant(tenant_id):
+    # Tenant by id, without a query once the registry is loaded
+    tenant = get_registry().by_id.get(tenant_id)
+    if tenant is None:
+        reset_registry()  # Created by another process since the last load
+        tenant = get_registry().by_id[tenant_id]
+    return tenant
+
+
+def tenant_for_host(host):
+    domain, _ = split_domain_port(host)
+    return get_registry().by_domain.get(domain.lower()) or get_default_tenant()
+
+
+class TenantMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = tenant_for_host(request.get_host())
+        return self.get_response(request)
@@ -1,3 +1,953 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+import zipfile
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.forms import modelform_factory
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from firequote import db_config, db_router, middleware, warmup
+
+from . import archive, docx_engine, item_library, pricing, search, services, static_assets, tenants
+from .admin import QuoteAdminForm
+from .management.commands import index_quotes
+from .models import TITLE_CHOICES, ArchiveBlob, ArchivedDocument, Client, LibraryItem, Norm, Quote, QuoteSearchEntry, RateBand, Tenant
+
+
+def template_files():
+    # The bundled .docx templates (not the ~$ lock files Word leaves behind)
+    return sorted(
+        name for name in os.listdir(services.TEMPLATES_DOCS_DIR)
+        if name.endswith(".docx") and not name.startswith("~$")
+    )
+
+
+def template_variables(compiled):
+    return {slot.name for member in compiled.members if member.part for slot in member.part.slots}
+
+
+def render_with_docxtpl(path, context):
+    from docxtpl import DocxTemplate
+
+    doc = DocxTemplate(path)
+    doc.render(context, autoescape=True)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class DocxEngineTests(SimpleTestCase):
+    # The fast path must produce the same document text as docxtpl
+
+    def context_for(self, compiled):
+        # Values exercising escaping, tabs (bullets) and line breaks
+        return {
+            name: f"-\t{name} <A & B> \"ñandú\"\n-\tsegunda línea de {name}"
+            for name in template_variables(compiled)
+        }
+
+    def test_bundled_templates_match_docxtpl(self):
+        rendered = 0
+        for name in template_files():
+            path = os.path.join(services.TEMPLATES_DOCS_DIR, name)
+            compiled = docx_engine.get_compiled(path)
+            if compiled is None:
+                continue  # Needs docxtpl anyway
+            with self.subTest(template=name):
+                context = self.context_for(compiled)
+                fast = docx_engine.render_docx(path, context)
+                with zipfile.ZipFile(io.BytesIO(fast)) as zf:
+                    self.assertIsNone(zf.testzip())  # Every CRC and size checks out
+                self.assertEqual(search.extract_text(fast), search.extract_text(render_with_docxtpl(path, context)))
+            rendered += 1
+        self.assertGreater(rendered, 0)
+
+    def test_static_members_are_copied_unchanged(self):
+        name = template_files()[0]
+        path = os.path.join(services.TEMPLATES_DOCS_DIR, name)
+        compiled = docx_engine.get_compiled(path)
+        if compiled is None:
+            self.skipTest(f"{name} uses the docxtpl fallback")
+        fast = docx_engine.render_docx(path, self.context_for(compiled))
+        with zipfile.ZipFile(path) as source, zipfile.ZipFile(io.BytesIO(fast)) as output:
+            self.assertEqual(source.namelist(), output.namelist())
+            for info in source.infolist():
+                if not docx_engine.TEMPLATE_PART_RE.match(info.filename):
+                    self.assertEqual(source.read(info), output.read(info.filename))
+
+    def test_templates_with_logic_fall_back(self):
+        with self.assertRaises(docx_engine.NotSimpleTemplate):
+            docx_engine.CompiledPart("<w:t>{% for item in items %}{{ item }}{% endfor %}</w:t>")
+        with self.assertRaises(docx_engine.NotSimpleTemplate):
+            docx_engine.CompiledPart("<w:t>{{ name|upper }}</w:t>")
+
+
+class PricingTests(TestCase):
+    # price_quote (bisect, one quote) and reprice_open_quotes (NumPy) must agree to the cent
+
+    AREAS = [None, "0", "0.01", "1.50", "99.99", "100", "499.99", "500", "999.99", "1000", "1000.01", "12345.67"]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(slug="pricing", name="Pricing")
+        cls.client_record = Client.objects.create(tenant=cls.tenant, full_name="Ana Pérez", company="ACME")
+        for service, building_type, min_area, rate, fee in [
+            ("detection", "", "0", "10.00", "500.00"),
+            ("detection", "", "1000", "8.50", "0"),
+            ("detection", "commercial", "100", "12.35", "0"),
+            ("detection", "commercial", "500", "11.00", "6000.00"),
+            ("protection", "", "0", "0.33", "0"),
+            ("human_safety", "residential", "0", "2.00", "100.00"),
+        ]:
+            RateBand.objects.create(
+                service=service, building_type=building_type, min_area=Decimal(min_area),
+                rate_per_sqm=Decimal(rate), minimum_fee=Decimal(fee),
+            )
+
+    def make_quote(self, building_type, area, **fields):
+        flags = {"is_detection": True, "is_protection": True, "is_human_safety": True} | fields
+        return Quote.objects.create(
+            tenant=self.tenant, client=self.client_record, project_name="Bodega",
+            building_type=building_type, area_sqm=Decimal(area) if area is not None else None, **flags,
+        )
+
+    def scalar_values(self, quote):
+        fresh = Quote(
+            building_type=quote.building_type, area_sqm=quote.area_sqm,
+            **{flag: getattr(quote, flag) for flag, _ in pricing.SERVICE_FIELDS.values()},
+        )
+        pricing.price_quote(fresh)
+        return [getattr(fresh, field) for field in pricing.PRICE_FIELDS]
+
+    def test_scalar_and_vectorized_prices_match(self):
+        quotes = [
+            self.make_quote(building_type, area)
+            for building_type in ("", "residential", "commercial")
+            for area in self.AREAS
+        ]
+        quotes.append(self.make_quote("commercial", "750", is_protection=False))
+        # Wipe the values saved by the pre_save signal (update() sends none)
+        Quote.objects.filter(tenant=self.tenant).update(
+            **{field: 0 for field in pricing.PRICE_FIELDS}
+        )
+
+        checked, changed = pricing.reprice_open_quotes()
+        self.assertEqual(checked, len(quotes))
+        self.assertEqual(changed, sum(1 for q in quotes if q.total_value))
+
+        for quote in quotes:
+            stored = Quote.objects.get(pk=quote.pk)
+            with self.subTest(building_type=stored.building_type, area=stored.area_sqm):
+                self.assertEqual([getattr(stored, f) for f in pricing.PRICE_FIELDS], self.scalar_values(stored))
+                self.assertEqual([getattr(stored, f) for f in pricing.PRICE_FIELDS],
+                                 [getattr(quote, f) for f in pricing.PRICE_FIELDS])
+
+    def test_band_boundaries_and_fallback(self):
+        cases = [
+            # (building type, area, detection, protection, human safety)
+            ("", "0.01", "500.00", "0.00", "0.00"),  # Minimum fee; no blank human safety band
+            ("", "1.50", "500.00", "0.50", "0.00"),  # 0.495 rounds half up
+            ("", "999.99", "9999.90", "330.00", "0.00"),
+            ("", "1000", "8500.00", "330.00", "0.00"),  # Next band starts at its min_area
+            ("residential", "10", "500.00", "3.30", "100.00"),  # Blank bands fill in for detection
+            ("commercial", "99.99", "0.00", "33.00", "0.00"),  # Below its first band: no fallback
+            ("commercial", "100", "1235.00", "33.00", "0.00"),
+            ("commercial", "499.99", "6174.88", "165.00", "0.00"),
+            ("commercial", "500", "6000.00", "165.00", "0.00"),  # Minimum fee of the second band
+        ]
+        for building_type, area, detection, protection, human_safety in cases:
+            with self.subTest(building_type=building_type, area=area):
+                quote = self.make_quote(building_type, area)
+                expected = [Decimal(detection), Decimal(protection), Decimal(human_safety)]
+                self.assertEqual([quote.value_detection, quote.value_protection, quote.value_human_safety], expected)
+                self.assertEqual(quote.total_value, sum(expected))
+                self.assertEqual(self.scalar_values(quote), expected + [sum(expected)])
+
+    def test_only_open_quotes_are_repriced(self):
+        manual = self.make_quote("", "100", manual_pricing=True)
+        generated = self.make_quote("", "100")
+        Quote.objects.filter(pk=generated.pk).update(generated_at=generated.created_at)
+        Quote.objects.filter(pk__in=[manual.pk, generated.pk]).update(total_value=1)
+
+        self.assertEqual(pricing.reprice_open_quotes(), (0, 0))
+        self.assertEqual(
+            list(Quote.objects.filter(pk__in=[manual.pk, generated.pk]).values_list("total_value", flat=True)),
+            [Decimal("1.00"), Decimal("1.00")],
+        )
+
+    def test_saves_keep_values_unless_pricing_inputs_change(self):
+        quote = self.make_quote("", "100")
+        self.assertEqual(quote.value_detection, Decimal("1000.00"))
+        RateBand.objects.filter(service="detection", min_area=0).update(
+            rate_per_sqm=Decimal("20.00"), updated_at=timezone.now()
+        )
+
+        quote = Quote.objects.get(pk=quote.pk)
+        quote.project_name = "Bodega norte"
+        quote.save()
+        self.assertEqual(Quote.objects.get(pk=quote.pk).value_detection, Decimal("1000.00"))
+
+        quote.area_sqm = Decimal("100.5")
+        quote.save()
+        self.assertEqual(Quote.objects.get(pk=quote.pk).value_detection, Decimal("2010.00"))
+
+    def test_manual_edits_require_manual_pricing(self):
+        quote = Quote.objects.get(pk=self.make_quote("", "100").pk)
+        quote.total_value = Decimal("1.00")
+        with self.assertRaises(ValidationError) as caught:
+            quote.full_clean()
+        self.assertIn("total_value", caught.exception.message_dict)
+
+        quote.manual_pricing = True
+        quote.full_clean()
+        quote.save()
+        self.assertEqual(Quote.objects.get(pk=quote.pk).total_value, Decimal("1.00"))
+
+    def test_vectorized_prices_do_not_overflow(self):
+        # area × rate beyond int64: NumPy must not wrap around
+        import numpy as np
+
+        table = pricing.RateTable("test", [
+            ("detection", "", "0", "9999999999.99", "0"),
+            ("protection", "", "0", "10.00", "500.00"),
+        ])
+        areas = ["99999999.99", "1.50", "0.01"]
+        area = np.array([pricing.to_cents(a) for a in areas], dtype=np.int64)
+        selected = {service: np.ones(len(areas), dtype=bool) for service in pricing.SERVICE_FIELDS}
+        values = pricing.price_rows(table, [""] * len(areas), area, selected)
+        for row, area_sqm in enumerate(areas):
+            expected = [table.value_cents(service, "", pricing.to_cents(area_sqm)) for service in pricing.SERVICE_FIELDS]
+            with self.subTest(area=area_sqm):
+                self.assertEqual([int(v) for v in values[row]], expected + [sum(expected)])
+
+
+class QuoteETagTests(TestCase):
+    # Conditional GET of the quote page: 304 while nothing changed, a new ETag after any change
+
+    @classmethod
+    def setUpTestData(cls):
+        # Created by migration 0013 in a fresh database
+        cls.tenant, _ = Tenant.objects.get_or_create(
+            slug=settings.FIREQUOTE_DEFAULT_TENANT, defaults={"name": "Principal"}
+        )
+        cls.client_record = Client.objects.create(tenant=cls.tenant, full_name="Ana Pérez", company="ACME")
+        cls.norm = Norm.objects.create(tenant=cls.tenant, code="NFPA 72", is_default=True)
+        cls.quote = Quote.objects.create(
+            tenant=cls.tenant, client=cls.client_record, project_name="Bodega", is_detection=True,
+        )
+
+    def setUp(self):
+        tenants.reset_registry()  # The registry of this process may hold another test's tenants
+        self.url = reverse("quote_details", args=[self.quote.id])
+        self.client.get(self.url)  # Sets the CSRF cookie, part of the page's ETag
+
+    def etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_repeat_get_is_not_modified(self):
+        etag = self.etag()
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.etag(), etag)
+
+    def test_quote_change_changes_etag(self):
+        etag = self.etag()
+        self.quote.project_name = "Bodega norte"
+        self.quote.save()
+        self.assertNotEqual(self.etag(), etag)
+        self.assertEqual(self.client.get(self.url, headers={"if-none-match": etag}).status_code, 200)
+
+    def test_client_change_changes_etag(self):
+        etag = self.etag()
+        self.client_record.company = "ACME S.A."
+        self.client_record.save()
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_norm_change_changes_etag(self):
+        etag = self.etag()
+        Norm.objects.create(tenant=self.tenant, code="NFPA 13")
+        changed = self.etag()
+        self.assertNotEqual(changed, etag)
+
+        self.norm.description = "Código nacional de alarmas de incendio"
+        self.norm.save()
+        self.assertNotEqual(self.etag(), changed)
+
+
+class QuoteFormTests(TestCase):
+    # The quote form creates clients and quotes through services.create_client/create_quote
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant, _ = Tenant.objects.get_or_create(
+            slug=settings.FIREQUOTE_DEFAULT_TENANT, defaults={"name": "Principal"}
+        )
+
+    def setUp(self):
+        tenants.reset_registry()
+
+    def form_titles(self):
+        # Values of the "Título" select of the new client, as the page offers them
+        path = os.path.join(settings.BASE_DIR, "quotes", "templates", "quotes", "quote_form.html")
+        with open(path, encoding="utf-8") as f:
+            select = re.search(r'<select name="new_client_title".*?</select>', f.read(), re.DOTALL).group(0)
+        return [value for value in re.findall(r'<option value="([^"]*)"', select) if value]
+
+    def test_new_client_with_every_title(self):
+        titles = self.form_titles()
+        self.assertIn("seniora", titles)
+        for title in titles:
+            with self.subTest(title=title):
+                response = self.client.post(reverse("quote_form"), {
+                    "new_client_title": title,
+                    "new_client_name": f"Cliente {title}",
+                    "new_client_company": "ACME",
+                    "new_client_email": "cliente@example.com",
+                    "project_name": "Bodega",
+                    "is_detection": "on",
+                    "delivery_time_unit": "weeks",
+                })
+                client = Client.objects.for_tenant(self.tenant).get(full_name=f"Cliente {title}")
+                quote = Quote.objects.get(client=client)
+                self.assertRedirects(response, reverse("quote_details", args=[quote.id]), fetch_redirect_response=False)
+                self.assertEqual(client.title, title)
+
+    def test_invalid_input_is_reported(self):
+        response = self.client.post(reverse("quote_form"), {
+            "new_client_name": "Ana Pérez",
+            "new_client_company": "ACME",
+            "new_client_email": "no es un correo",
+            "project_name": "Bodega",
+        }, follow=True)
+        self.assertContains(response, "Datos no válidos")
+        self.assertFalse(Client.objects.filter(full_name="Ana Pérez").exists())
+
+    def test_project_name_is_limited_to_the_model_length(self):
+        client = Client.objects.create(tenant=self.tenant, full_name="Ana Pérez", company="ACME")
+        with self.assertRaises(services.ServiceError):
+            services.build_quote({"client_id": client.id, "project_name": "x" * 251}, self.tenant)
+        with self.assertRaises(services.ServiceError):
+            services.build_quote({"client_id": client.id, "project_name": "Bodega", "delivery_time_unit": "años"}, self.tenant)
+
+    def test_norm_ids_must_be_a_list_of_ids(self):
+        self.assertEqual(services.to_id_list(["1", 2]), [1, 2])
+        self.assertIsNone(services.to_id_list(None))
+        for value in ("12", 12, {"id": 1}, [True], ["1a"], [1.5]):
+            with self.subTest(value=value), self.assertRaises(services.ServiceError):
+                services.to_id_list(value)
+
+
+class ApiTests(TestCase):
+    # Token authentication, validation and batch creation of the JSON API
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant, _ = Tenant.objects.get_or_create(
+            slug=settings.FIREQUOTE_DEFAULT_TENANT, defaults={"name": "Principal"}
+        )
+        cls.token = cls.tenant.set_api_token()
+        cls.tenant.save()
+        cls.client_record = Client.objects.create(tenant=cls.tenant, full_name="Ana Pérez", company="ACME")
+
+    def setUp(self):
+        tenants.reset_registry()
+        item_library.reset_index()
+
+    def post(self, name, payload, token=None, **extra):
+        token = token if token is not None else self.token
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return self.client.post(reverse(name, **extra), body, content_type="application/json", headers=headers)
+
+    def quote_payload(self, position, **extra):
+        return {
+            "client_id": self.client_record.id,
+            "project_name": f"Bodega {position}",
+            "is_detection": True,
+            "items_detection": ["Detectores de humo", f"Panel {position}"],
+            **extra,
+        }
+
+    def test_token_is_required(self):
+        payload = {"full_name": "Luis", "company": "ACME"}
+        self.assertEqual(self.post("api_client_create", payload, token="").status_code, 401)
+        self.assertEqual(self.post("api_client_create", payload, token="otro").status_code, 401)
+        self.assertFalse(Client.objects.filter(full_name="Luis").exists())
+
+        # Revoked: the old token stops working at once
+        Tenant.objects.filter(pk=self.tenant.pk).update(api_token_digest="")
+        self.assertEqual(self.post("api_client_create", payload).status_code, 401)
+
+    def test_invalid_payloads_are_rejected(self):
+        self.assertEqual(self.post("api_quote_create", "{no es json").status_code, 400)
+        self.assertEqual(self.post("api_quote_create", "[1, 2]").status_code, 400)
+        self.assertEqual(self.post("api_quote_batch", {"quotes": []}).status_code, 400)
+        self.assertEqual(self.post("api_quote_batch", {"quotes": ["Bodega"]}).status_code, 400)
+        response = self.post("api_client_create", {"full_name": "Luis", "company": "ACME", "email": "x"})
+        self.assertContains(response, "Datos no válidos", status_code=400)
+
+    def test_batch_is_all_or_nothing(self):
+        quotes = [self.quote_payload(1), self.quote_payload(2, client_id=self.client_record.id + 1000)]
+        response = self.post("api_quote_batch", {"quotes": quotes})
+        self.assertContains(response, "Clientes inexistentes", status_code=400)
+        response = self.post("api_quote_batch", {"quotes": [self.quote_payload(1), {"project_name": "Bodega"}]})
+        self.assertContains(response, "Cotización #2", status_code=400)
+        self.assertFalse(Quote.objects.exists())
+        self.assertFalse(LibraryItem.objects.exists())
+
+    def test_batch_counts_library_items_once_per_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post("api_quote_batch", {"quotes": [self.quote_payload(n) for n in range(3)]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["quotes"]), 3)
+        counts = dict(LibraryItem.objects.for_tenant(self.tenant).values_list("text", "usage_count"))
+        self.assertEqual(counts, {"Detectores de humo": 3, "Panel 0": 1, "Panel 1": 1, "Panel 2": 1})
+        self.assertEqual(item_library.suggest(self.tenant.id, "detection", "dete"),
+                         [{"text": "Detectores de humo", "count": 3}])
+
+        # The number of queries does not grow with the batch
+        def batch_queries(size):
+            batch = [self.quote_payload(n) for n in range(size)]
+            with CaptureQueriesContext(connections["default"]) as queries:
+                services.create_quotes(batch, self.tenant)
+            return len(queries)
+
+        self.assertEqual(batch_queries(2), batch_queries(20))
+        self.assertEqual(LibraryItem.objects.get(text="Detectores de humo").usage_count, 25)
+
+
+class ItemLibraryTests(TestCase):
+    # Usage counters follow the quotes; suggestions come from the in-memory prefix index
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(slug="library", name="Library")
+        cls.other_tenant = Tenant.objects.create(slug="library-other", name="Other")
+        cls.client_record = Client.objects.create(tenant=cls.tenant, full_name="Ana Pérez", company="ACME")
+
+    def setUp(self):
+        item_library.reset_index()
+        self.addCleanup(item_library.reset_index)
+
+    def create_quote(self, *items, tenant=None):
+        tenant = tenant or self.tenant
+        client = self.client_record if tenant == self.tenant else Client.objects.create(tenant=tenant, full_name="Luis")
+        with self.captureOnCommitCallbacks(execute=True):
+            return services.create_quote(
+                {"client_id": client.id, "project_name": "Bodega", "items_detection": list(items)}, tenant
+            )
+
+    def suggest(self, prefix, tenant=None):
+        return item_library.suggest((tenant or self.tenant).id, "detection", prefix)
+
+    def test_items_are_normalized(self):
+        self.assertEqual(item_library.clean_item("  •\tDetector   de humo "), "Detector de humo")
+        self.assertEqual(item_library.normalize_item("- Detección  TÉRMICA"), "deteccion termica")
+        self.assertEqual(item_library.item_map("- Panel\n\n• panel\nSirena"), {"panel": "Panel", "sirena": "Sirena"})
+
+    def test_suggestions_rank_by_usage_and_match_prefixes(self):
+        self.create_quote("Detector de humo", "Detección térmica")
+        self.create_quote("Detector de humo", "Sirena")
+        self.create_quote("- detector de humo", "Detector de gas")
+
+        self.assertEqual(self.suggest("dete"), [
+            {"text": "Detector de humo", "count": 3},
+            {"text": "Detección térmica", "count": 1},
+            {"text": "Detector de gas", "count": 1},
+        ])
+        self.assertEqual(self.suggest("DETECCION"), [{"text": "Detección térmica", "count": 1}])
+        self.assertEqual(self.suggest("panel"), [])
+        self.assertEqual(item_library.suggest(self.tenant.id, "desconocida", "dete"), [])
+
+        # The table and a fresh index agree with the one kept up to date
+        counts = dict(LibraryItem.objects.for_tenant(self.tenant).values_list("text", "usage_count"))
+        self.assertEqual(counts["Detector de humo"], 3)
+        item_library.reset_index()
+        self.assertEqual(self.suggest("detector de h"), [{"text": "Detector de humo", "count": 3}])
+
+    def test_suggestions_are_scoped_to_the_tenant(self):
+        self.create_quote("Detector de humo")
+        self.create_quote("Detector lineal", tenant=self.other_tenant)
+        self.assertEqual(self.suggest("detector"), [{"text": "Detector de humo", "count": 1}])
+        self.assertEqual(self.suggest("detector", self.other_tenant), [{"text": "Detector lineal", "count": 1}])
+
+    def test_edits_update_the_counters(self):
+        quote = self.create_quote("Detector de humo", "Sirena")
+        with self.captureOnCommitCallbacks(execute=True):
+            services.update_quote_details(quote, {"items_detection": "Detector de humo\nPanel"}, None)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.update_quote_details(quote, {"items_detection": "Detector de humo\nPanel"}, None)
+
+        counts = dict(LibraryItem.objects.for_tenant(self.tenant).values_list("text", "usage_count"))
+        self.assertEqual(counts, {"Detector de humo": 1, "Sirena": 0, "Panel": 1})
+        self.assertEqual(self.suggest("s"), [])  # Unused items are not suggested
+
+        self.assertEqual(item_library.rebuild_library()["detection"], 2)
+        counts = dict(LibraryItem.objects.for_tenant(self.tenant).values_list("text", "usage_count"))
+        self.assertEqual(counts, {"Detector de humo": 1, "Panel": 1})
+
+    def test_suggestions_view(self):
+        self.create_quote("Detector de humo")
+        Tenant.objects.get_or_create(slug=settings.FIREQUOTE_DEFAULT_TENANT, defaults={"name": "Principal"})
+        tenants.reset_registry()
+        response = self.client.get(reverse("item_suggestions"), {"section": "detection", "q": "dete"})
+        self.assertEqual(response.json(), {"suggestions": []})  # Another office's item
+
+
+@override_settings(ALLOWED_HOSTS=["testserver", "otra.example.com"])
+class TenantIsolationTests(TestCase):
+    # Records of one office are out of reach of another through the API and the admin
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant, _ = Tenant.objects.get_or_create(
+            slug=settings.FIREQUOTE_DEFAULT_TENANT, defaults={"name": "Principal"}
+        )
+        cls.other = Tenant.objects.create(slug="otra", name="Otra", domain="otra.example.com")
+        cls.token = cls.tenant.set_api_token()
+        cls.tenant.save()
+        cls.other_token = cls.other.set_api_token()
+        cls.other.save()
+        cls.client_record = Client.objects.create(tenant=cls.tenant, full_name="Ana Pérez", company="ACME")
+        cls.other_client = Client.objects.create(tenant=cls.other, full_name="Luis Gómez", company="Otra")
+        cls.norm = Norm.objects.create(tenant=cls.tenant, code="NFPA 72")
+        cls.other_norm = Norm.objects.create(tenant=cls.other, code="NFPA 13")
+        cls.quote = Quote.objects.create(tenant=cls.tenant, client=cls.client_record, project_name="Bodega")
+
+    def setUp(self):
+        tenants.reset_registry()
+
+    def post(self, name, payload, token, host="testserver", **extra):
+        return self.client.post(
+            reverse(name, **extra), json.dumps(payload), content_type="application/json",
+            headers={"Authorization": f"Bearer {token}"}, HTTP_HOST=host,
+        )
+
+    def test_tokens_only_open_their_own_tenant(self):
+        payload = {"full_name": "Marta", "company": "ACME"}
+        self.assertEqual(self.post("api_client_create", payload, self.other_token).status_code, 401)
+        self.assertEqual(self.post("api_client_create", payload, self.token, host="otra.example.com").status_code, 401)
+
+        response = self.post("api_client_create", payload, self.other_token, host="otra.example.com")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Client.objects.get(pk=response.json()["id"]).tenant, self.other)
+
+    def test_api_does_not_reach_other_tenants_records(self):
+        payload = {"client_id": self.client_record.id, "project_name": "Bodega", "norms": [self.norm.id]}
+        response = self.post("api_quote_create", payload, self.other_token, host="otra.example.com")
+        self.assertContains(response, "Cliente inexistente", status_code=400)
+
+        response = self.post("api_quote_generate", {}, self.other_token, host="otra.example.com", args=[self.quote.id])
+        self.assertEqual(response.status_code, 404)
+
+        # Norm ids of another office are dropped
+        payload = {"client_id": self.other_client.id, "project_name": "Bodega", "norms": [self.norm.id]}
+        response = self.post("api_quote_create", payload, self.other_token, host="otra.example.com")
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Quote.objects.get(pk=response.json()["id"]).norms.exists())
+
+    def test_admin_form_offers_and_accepts_only_the_quote_tenant(self):
+        form_class = modelform_factory(Quote, form=QuoteAdminForm, fields=["client", "project_name", "norms"])
+        form = form_class(instance=self.quote)
+        self.assertEqual(list(form.fields["client"].queryset), [self.client_record])
+        self.assertEqual(list(form.fields["norms"].queryset), [self.norm])
+
+        form = form_class({"client": self.other_client.id, "project_name": "Bodega"}, instance=self.quote)
+        self.assertIn("client", form.errors)
+
+        form = form_class({"client": self.client_record.id, "project_name": "Bodega", "norms": [self.norm.id]},
+                          instance=self.quote)
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_quote_clean_rejects_another_tenants_client(self):
+        quote = Quote(tenant=self.other, client=self.client_record, project_name="Bodega")
+        with self.assertRaises(ValidationError) as caught:
+            quote.full_clean()
+        self.assertIn("client", caught.exception.message_dict)
+
+        form_class = modelform_factory(Quote, form=QuoteAdminForm, fields=["tenant", "client", "project_name", "norms"])
+        form = form_class({
+            "tenant": self.tenant.id, "client": self.client_record.id, "project_name": "Bodega",
+            "norms": [self.norm.id, self.other_norm.id],
+        })
+        self.assertIn("norms", form.errors)
+
+
+class LoadTestHarnessTests(SimpleTestCase):
+    # loadtest.py (project root) must only send data the application accepts
+
+    def setUp(self):
+        import loadtest
+
+        self.loadtest = loadtest
+
+    def test_client_titles_are_model_choices(self):
+        self.assertEqual(set(self.loadtest.CLIENT_TITLES), {value for value, _ in TITLE_CHOICES})
+
+    def test_combinations_cover_every_template(self):
+        filenames = {
+            services.get_template_filename(*(flag in combination for flag in services.SERVICE_FLAGS))
+            for combination in self.loadtest.COMBINATIONS
+        }
+        self.assertEqual(len(filenames), 21)
+        for filename in filenames:
+            self.assertTrue(os.path.exists(os.path.join(services.TEMPLATES_DOCS_DIR, filename)), filename)
+
+    def test_percentile_and_summary(self):
+        latencies = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(self.loadtest.percentile(latencies, 50), 0.05)
+        self.assertEqual(self.loadtest.percentile(latencies, 99), 0.099)
+        self.assertIsNone(self.loadtest.percentile([], 50))
+        summary = self.loadtest.summarize(latencies, errors=25)
+        self.assertEqual((summary["requests"], summary["error_rate"], summary["p90_ms"]), (125, 0.2, 90.0))
+
+    def test_refuses_remote_hosts(self):
+        self.loadtest.check_local("http://127.0.0.1:8000")
+        with self.assertRaises(SystemExit):
+            self.loadtest.check_local("http://10.1.2.3:8000")
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.compress = middleware.CompressionMiddleware(lambda request: None)
+        self.body = ("<p>Cotización de protección contra incendios</p>" * 50).encode("utf-8")
+
+    def respond(self, accept_encoding, **meta):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding, **meta)
+        return self.compress.process_response(request, HttpResponse(self.body, content_type="text/html"))
+
+    def test_accept_encoding_q_values(self):
+        self.assertTrue(middleware.accepts_brotli("gzip, deflate, br"))
+        self.assertTrue(middleware.accepts_brotli("gzip;q=1.0, br;q=0.5"))
+        self.assertTrue(middleware.accepts_brotli("*"))
+        self.assertFalse(middleware.accepts_brotli("gzip, br;q=0"))
+        self.assertFalse(middleware.accepts_brotli("br;q=0.0, *;q=0.5"))
+        self.assertFalse(middleware.accepts_brotli("*;q=0, gzip"))
+        self.assertFalse(middleware.accepts_brotli(""))
+
+    def test_refused_brotli_falls_back_to_gzip(self):
+        self.assertEqual(self.respond("gzip, br;q=0")["Content-Encoding"], "gzip")
+
+    def test_brotli_when_accepted(self):
+        if middleware.brotli is None:
+            self.skipTest("brotli is not installed")
+        response = self.respond("gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(middleware.brotli.decompress(response.content), self.body)
+
+    def test_pages_with_csrf_token_are_not_brotli_compressed(self):
+        # BREACH: forms go through GZip, which pads every response randomly
+        response = self.respond("gzip, br", CSRF_COOKIE_NEEDS_UPDATE=True)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_documents_are_not_recompressed(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, br")
+        response = HttpResponse(self.body, content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+        self.assertFalse(self.compress.process_response(request, response).has_header("Content-Encoding"))
+
+
+class StaticAssetTests(SimpleTestCase):
+    def setUp(self):
+        static_assets.is_vendored.cache_clear()
+        self.addCleanup(static_assets.is_vendored.cache_clear)
+
+    def test_cdn_until_vendored(self):
+        with tempfile.TemporaryDirectory() as empty, override_settings(
+            STATICFILES_DIRS=[empty], STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"]
+        ):
+            tag = static_assets.asset_tag("css/bootstrap.min.css")
+        self.assertIn(static_assets.CDN_URL + "css/bootstrap.min.css", tag)
+        self.assertIn('crossorigin="anonymous"', tag)
+        self.assertIn(static_assets.ASSETS["css/bootstrap.min.css"], tag)
+
+    def test_vendored_files_are_served_locally(self):
+        with tempfile.TemporaryDirectory() as root:
+            target = os.path.join(root, *static_assets.STATIC_PREFIX.split("/"), "js")
+            os.makedirs(target)
+            with open(os.path.join(target, "bootstrap.bundle.min.js"), "w") as f:
+                f.write("/* bootstrap */")
+            with override_settings(
+                STATICFILES_DIRS=[root], STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"]
+            ):
+                tag = static_assets.asset_tag("js/bootstrap.bundle.min.js")
+        self.assertIn('src="/static/quotes/vendor/bootstrap/js/bootstrap.bundle.min.js"', tag)
+        self.assertNotIn("crossorigin", tag)
+        self.assertIn(static_assets.ASSETS["js/bootstrap.bundle.min.js"], tag)
+
+
+W_NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+)
+
+
+def make_docx(body, header="", footer=""):
+    # Minimal .docx-like zip with the parts search.extract_text reads
+    def part(root, xml):
+        return f'<?xml version="1.0" encoding="UTF-8"?><w:{root} {W_NAMESPACES}>{xml}</w:{root}>'
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("word/document.xml", part("document", f"<w:body>{body}</w:body>"))
+        if header:
+            zf.writestr("word/header1.xml", part("hdr", header))
+            zf.writestr("word/header2.xml", part("hdr", header))
+        if footer:
+            zf.writestr("word/footer1.xml", part("ftr", footer))
+    return buffer.getvalue()
+
+
+def paragraph(*runs):
+    return "<w:p>" + "".join(f"<w:r><w:t>{text}</w:t></w:r>" for text in runs) + "</w:p>"
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(slug="search", name="Search")
+        cls.other_tenant = Tenant.objects.create(slug="search-other", name="Other")
+        client = Client.objects.create(tenant=cls.tenant, full_name="Ana Pérez", company="ACME")
+        cls.quote = Quote.objects.create(
+            tenant=cls.tenant, client=client, project_name="Bodega", is_detection=True, deliver_autocad=True,
+        )
+
+    def test_extract_text(self):
+        text_box = (
+            "<w:p><w:r><mc:AlternateContent><mc:Choice>"
+            + paragraph("Texto en cuadro")
+            + "</mc:Choice><mc:Fallback>" + paragraph("Texto en cuadro")
+            + "</mc:Fallback></mc:AlternateContent></w:r><w:r><w:t>Párrafo</w:t></w:r></w:p>"
+        )
+        content = make_docx(
+            paragraph("Sistema de ", "rociadores") + "<w:p><w:r><w:t>A</w:t><w:tab/><w:t>B</w:t></w:r></w:p>" + text_box,
+            header=paragraph("FireQuote S.A.S."),
+            footer=paragraph("Página"),
+        )
+        self.assertEqual(
+            search.extract_text(content).splitlines(),
+            ["FireQuote S.A.S.", "Sistema de rociadores", "A B", "Texto en cuadro", "Párrafo", "Página"],
+        )
+
+    def test_highlight_escapes_content(self):
+        headline = f"<b>{search.START_MARK}fuego{search.STOP_MARK}</b> & humo"
+        self.assertEqual(search.highlight(headline), "&lt;b&gt;<mark>fuego</mark>&lt;/b&gt; &amp; humo")
+
+    def test_index_and_search(self):
+        search.index_document(self.quote, make_docx(paragraph("&lt;script&gt; sistema de rociadores automáticos")))
+        self.assertEqual(QuoteSearchEntry.objects.filter(quote=self.quote).count(), 1)
+
+        results = search.search_quotes(self.tenant, "rociador")  # Spanish stemming
+        self.assertEqual([entry.quote_id for entry in results], [self.quote.id])
+        self.assertIn("<mark>rociadores</mark>", results[0].snippet)
+        self.assertIn("&lt;script&gt;", results[0].snippet)
+        self.assertNotIn("<script>", results[0].snippet)
+
+        self.assertEqual(search.search_quotes(self.tenant, "ascensores"), [])
+        self.assertEqual(search.search_quotes(self.other_tenant, "rociadores"), [])
+
+    def test_reindex_does_not_mark_quotes_as_generated(self):
+        tenants.reset_registry()
+        with mock.patch.object(index_quotes, "connections"):  # Keep the test connection open
+            self.assertEqual(index_quotes.index_quote(self.quote.id, generate=True), "indexed")
+        self.quote.refresh_from_db()
+        self.assertIsNone(self.quote.generated_at)
+        self.assertTrue(QuoteSearchEntry.objects.filter(quote=self.quote).exists())
+        self.assertEqual(pricing.open_quotes().filter(pk=self.quote.pk).count(), 1)
+
+
+def zip_members(content):
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(slug="archive", name="Archive")
+        client = Client.objects.create(tenant=cls.tenant, full_name="Ana Pérez", company="ACME")
+        cls.quote = Quote.objects.create(tenant=cls.tenant, client=client, project_name="Bodega", is_detection=True)
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        storages = {
+            **settings.STORAGES,
+            "archive": {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": root.name}},
+        }
+        overridden = override_settings(STORAGES=storages)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.storage = archive.get_storage()
+        self.version_1 = make_docx(paragraph("Versión 1"), header=paragraph("Cabecera"))
+        self.version_2 = make_docx(paragraph("Versión 2"), header=paragraph("Cabecera"))
+
+    def digest(self, data):
+        return hashlib.sha256(data).hexdigest()
+
+    def test_members_are_stored_once(self):
+        first = archive.archive_document(self.quote, "v1.docx", self.version_1)
+        second = archive.archive_document(self.quote, "v2.docx", self.version_2)
+        # [Content_Types].xml and the two identical headers are shared: 3 blobs + the new document.xml
+        self.assertEqual(ArchiveBlob.objects.count(), 4)
+        self.assertEqual(first.blobs.count(), 3)
+        self.assertEqual(second.blobs.count(), 3)
+        self.assertEqual(zip_members(archive.open_document(first)), zip_members(self.version_1))
+        self.assertEqual(zip_members(archive.open_document(second)), zip_members(self.version_2))
+
+    def test_existing_blob_files_are_reused_or_repaired(self):
+        members = zip_members(self.version_1)
+        intact, broken = self.digest(members["word/document.xml"]), self.digest(members["word/header1.xml"])
+        intact_packed = zlib.compress(members["word/document.xml"], 0)  # Not what archive would write
+        self.storage.save(archive.blob_path(intact), io.BytesIO(intact_packed))
+        self.storage.save(archive.blob_path(broken), io.BytesIO(b"truncated"))
+
+        document = archive.archive_document(self.quote, "v1.docx", self.version_1)
+        with self.storage.open(archive.blob_path(intact)) as f:
+            self.assertEqual(f.read(), intact_packed)  # Kept as it was
+        self.assertEqual(zip_members(archive.open_document(document)), members)
+
+    def test_compaction_keeps_shared_blobs(self):
+        archive.archive_document(self.quote, "v1.docx", self.version_1)
+        second = archive.archive_document(self.quote, "v2.docx", self.version_2)
+        old_body = self.digest(zip_members(self.version_1)["word/document.xml"])
+
+        report = archive.compact(retention_days=30, keep_versions=1)
+        self.assertEqual((report["documents_dropped"], report["blobs_deleted"]), (1, 1))
+        self.assertEqual(list(ArchivedDocument.objects.values_list("id", flat=True)), [second.id])
+        self.assertFalse(ArchiveBlob.objects.filter(digest=old_body).exists())
+        self.assertFalse(self.storage.exists(archive.blob_path(old_body)))
+        self.assertEqual(zip_members(archive.open_document(second)), zip_members(self.version_2))
+
+    def test_compaction_drops_documents_not_accessed(self):
+        document = archive.archive_document(self.quote, "v1.docx", self.version_1)
+        ArchivedDocument.objects.filter(pk=document.pk).update(last_accessed_at=timezone.now() - timedelta(days=31))
+
+        self.assertEqual(archive.compact(retention_days=30, keep_versions=3, dry_run=True)["documents_dropped"], 1)
+        self.assertTrue(ArchivedDocument.objects.filter(pk=document.pk).exists())
+        report = archive.compact(retention_days=30, keep_versions=3)
+        self.assertEqual((report["documents_dropped"], report["blobs_deleted"]), (1, 3))
+        self.assertEqual(archive.archive_usage()["stored_bytes"], 0)
+
+    def test_only_old_stray_files_are_deleted(self):
+        old, recent = "a" * 64, "b" * 64
+        for digest in (old, recent):
+            self.storage.save(archive.blob_path(digest), io.BytesIO(b"stray"))
+        stale = time.time() - archive.STRAY_FILE_GRACE.total_seconds() - 60
+        os.utime(self.storage.path(archive.blob_path(old)), (stale, stale))
+
+        self.assertEqual(archive.compact()["stray_files_deleted"], 1)
+        self.assertFalse(self.storage.exists(archive.blob_path(old)))
+        self.assertTrue(self.storage.exists(archive.blob_path(recent)))
+        self.assertFalse(ArchiveBlob.objects.filter(digest=old).exists())  # The placeholder is gone
+
+    def test_stray_file_with_a_row_is_kept(self):
+        digest = "c" * 64
+        self.storage.save(archive.blob_path(digest), io.BytesIO(b"stray"))
+        ArchiveBlob.objects.create(digest=digest, size=5, stored_size=5)
+        self.assertFalse(archive.delete_stray_file(self.storage, digest, archive.blob_path(digest)))
+        self.assertTrue(self.storage.exists(archive.blob_path(digest)))
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    # DATABASES built from FIREQUOTE_DB_* environment variables
+
+    def environ(self, **values):
+        # The process environment without FIREQUOTE_DB_* variables, plus `values`
+        env = {k: v for k, v in os.environ.items() if not k.startswith("FIREQUOTE_DB_")}
+        env.update({f"FIREQUOTE_DB_{name}": value for name, value in values.items()})
+        return mock.patch.dict(os.environ, env, clear=True)
+
+    def test_defaults_use_persistent_connections(self):
+        with self.environ():
+            databases = db_config.build_databases()
+        self.assertEqual(list(databases), ["default"])
+        default = databases["default"]
+        self.assertEqual((default["NAME"], default["HOST"], default["PORT"]), ("firequote_db", "localhost", "5432"))
+        self.assertEqual(default["CONN_MAX_AGE"], 60)
+        self.assertTrue(default["CONN_HEALTH_CHECKS"])
+        self.assertEqual(default["OPTIONS"], {})
+        self.assertEqual(db_config.build_routers(databases), [])
+
+    def test_pool_disables_persistent_connections(self):
+        with self.environ(POOL="yes", POOL_MAX_SIZE="20", CONN_MAX_AGE="600", HEALTH_CHECKS="off"):
+            default = db_config.build_databases()["default"]
+        self.assertEqual(default["OPTIONS"]["pool"], {"min_size": 2, "max_size": 20, "timeout": 10})
+        self.assertEqual(default["CONN_MAX_AGE"], 0)
+        self.assertNotIn("CONN_HEALTH_CHECKS", default)
+
+    def test_replica_defaults_to_the_primary_settings(self):
+        with self.environ(NAME="cotizaciones", HOST="db1", REPLICA_HOST="db2", REPLICA_PORT="6432",
+                          CONN_MAX_AGE="", HEALTH_CHECKS="0"):
+            databases = db_config.build_databases()
+        replica = databases["replica"]
+        self.assertEqual((replica["NAME"], replica["HOST"], replica["PORT"]), ("cotizaciones", "db2", "6432"))
+        self.assertEqual(databases["default"]["HOST"], "db1")
+        self.assertEqual(replica["TEST"], {"MIRROR": "default"})
+        self.assertEqual(replica["CONN_MAX_AGE"], 60)
+        self.assertFalse(replica["CONN_HEALTH_CHECKS"])
+        self.assertEqual(db_config.build_routers(databases), ["firequote.db_router.ReplicaRouter"])
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_inside_transactions_use_the_primary(self):
+        router = db_router.ReplicaRouter()
+        token = db_router.use_replica.set(True)
+        self.addCleanup(db_router.use_replica.reset, token)
+        with mock.patch.object(connections["default"], "in_atomic_block", False):
+            self.assertEqual(router.db_for_read(Quote), "replica")
+        with mock.patch.object(connections["default"], "in_atomic_block", True):
+            self.assertEqual(router.db_for_read(Quote), "default")
+        self.assertEqual(router.db_for_write(Quote), "default")
+
+
+class WarmupTests(SimpleTestCase):
+    # Worker warm-up compiles the real .docx templates and survives broken ones
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.directory = root.name
+        for name in ("fast.docx", "legacy.docx", "broken.docx", "~$fast.docx"):
+            with open(os.path.join(self.directory, name), "wb") as f:
+                f.write(make_docx(paragraph("Cotización {{ project_name }}")))
+        for name, content in (("notes.txt", b"notas"), ("truncated.docx", b"PK\x03\x04 incompleto")):
+            with open(os.path.join(self.directory, name), "wb") as f:
+                f.write(content)
+
+    def test_only_docx_templates_are_compiled(self):
+        found = [name for name in sorted(os.listdir(self.directory))
+                 if warmup.is_template_file(os.path.join(self.directory, name))]
+        self.assertEqual(found, ["broken.docx", "fast.docx", "legacy.docx"])
+
+    def test_failures_are_isolated(self):
+        def get_compiled(path, namespace):
+            name = os.path.basename(path)
+            if name == "broken.docx":
+                raise ValueError("plantilla dañada")
+            return None if name == "legacy.docx" else object()
+
+        engine = mock.Mock(get_compiled=mock.Mock(side_effect=get_compiled))
+        sources = [("", self.directory), ("ausente", os.path.join(self.directory, "ausente"))]
+        with self.assertLogs("firequote.warmup", "WARNING"):
+            fallback, failed = warmup.compile_templates(engine, sources)
+        self.assertEqual(fallback, ["legacy.docx"])
+        self.assertEqual(failed, ["broken.docx"])
+        self.assertEqual(engine.get_compiled.call_count, 3)
@@ -1,7 +1,17 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.quote_form, name='quote_form'),
     path('quote/<int:quote_id>/', views.quote_details, name='quote_details'),
+    path('quote/<int:quote_id>/download/', views.quote_download, name='quote_download'),
+    path('items/suggest/', views.item_suggestions, name='item_suggestions'),
+    path('search/', views.quote_search, name='quote_search'),
+
+    # JSON API
+    path('api/clients/', api.client_create, name='api_client_create'),
+    path('api/clients/batch/', api.client_batch, name='api_client_batch'),
+    path('api/quotes/', api.quote_create, name='api_quote_create'),
+    path('api/quotes/batch/', api.quote_batch, name='api_quote_batch'),
+    path('api/quotes/<int:quote_id>/generate/', api.quote_generate, name='api_quote_generate'),
 ]
@@ -1,104 +1,66 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib import messages
-from docxtpl import DocxTemplate
-import os
-from datetime import datetime
-from .models import Quote, Client, Norm
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+import hashlib
+from datetime import date
+from .models import Quote, Client
+from .norm_catalog import catalog_version, get_norms
+from . import archive, item_library, search, services
 from django.conf import settings
 
 """
 quotes/views.py
 ---------------
 Handles quote creation, editing, and document generation (.docx)
-for the FireQuote Django web application.
+for the FireQuote Django web application. The workflow itself lives in
+services.py, shared with the JSON API (api.py).
 """
 
-# Utility: converts multiline text input into a clean list of items
-def parse_items(text):
-    if not text:
-        return []
-    return [i.strip() for i in text.split("\n") if i.strip()]
-
-# Determine the correct .docx template based on selected services and delivery formats
-def get_template_filename(is_detection, is_protection, is_human_safety, deliver_autocad, deliver_revit):
-    # Determine base name based on service combination
-    if is_detection and is_protection and is_human_safety:
-        base_name = "detection_protection_human_safety"
-    elif is_detection and is_protection:
-        base_name = "detection_protection"
-    elif is_detection and is_human_safety:
-        base_name = "detection_human_safety"
-    elif is_protection and is_human_safety:
-        base_name = "protection_human_safety"
-    elif is_detection:
-        base_name = "detection"
-    elif is_protection:
-        base_name = "protection"
-    elif is_human_safety:
-        base_name = "human_safety"
-    else:
-        return None
 
-    # Determine suffix based on delivery format (AutoCAD/Revit)
-    if deliver_autocad and deliver_revit:
-        suffix = "_both"
-    elif deliver_autocad:
-        suffix = "_autocad"
-    elif deliver_revit:
-        suffix = "_revit"
-    else:
-        suffix = ""
+# Return a generated .docx file as a downloadable response
+def document_response(output_filename, content):
+    response = HttpResponse(
+        content,
+        content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{output_filename}"'
+    return response
 
-    filename = f"{base_name}{suffix}.docx"
-    return filename
 
 # View: displays and handles the quote creation form
 def quote_form(request):
-    clients = Client.objects.all()  # populate dropdown with existing clients
+    clients = Client.objects.for_tenant(request.tenant)  # populate dropdown with the office's clients
 
     if request.method == "POST":
-        client_id = request.POST.get("existing_client")
-        project_name = request.POST.get("project_name")
-        service_tag = request.POST.get("service_tag") or "default"
-        delivery_time_value = request.POST.get("delivery_time_value") or 0
-        delivery_time_unit = request.POST.get("delivery_time_unit") or "days"
-
-        # If no existing client selected, create a new one if data provided
-        if not client_id:
-            new_name = request.POST.get("new_client_name")
-            new_company = request.POST.get("new_client_company")
-            if new_name and new_company:
-                client = Client.objects.create(
-                    full_name=new_name,
-                    company=new_company,
-                    email=request.POST.get("new_client_email", ""),
-                    phone=request.POST.get("new_client_phone", ""),
-                    title=request.POST.get("new_client_title", ""),
-                    position=request.POST.get("new_client_position", ""),
-                    city=request.POST.get("new_client_city", "")
-                )
-                client_id = client.id
-
-        # Validate required fields
-        if not all([client_id, project_name]):
-            messages.error(request, "Por favor completa todos los campos obligatorios.")
-            return redirect("quote_form")
+        data = {
+            "client_id": request.POST.get("existing_client"),
+            "project_name": request.POST.get("project_name"),
+            "service_tag": request.POST.get("service_tag"),
+            "building_type": request.POST.get("building_type"),
+            "area_sqm": request.POST.get("area_sqm"),
+            "delivery_time_value": request.POST.get("delivery_time_value"),
+            "delivery_time_unit": request.POST.get("delivery_time_unit"),
+        }
+        # Checkboxes are only posted when checked
+        for flag in services.SERVICE_FLAGS:
+            data[flag] = flag in request.POST
 
-        # Create the quote record with service and format options
-        quote = Quote.objects.create(
-            client_id=client_id,
-            project_name=project_name,
-            service_tag=service_tag,
-            delivery_time_value=delivery_time_value,
-            delivery_time_unit=delivery_time_unit,
-
-            is_detection=('is_detection' in request.POST),
-            is_protection=('is_protection' in request.POST),
-            is_human_safety=('is_human_safety' in request.POST),
-            deliver_autocad=('deliver_autocad' in request.POST),
-            deliver_revit=('deliver_revit' in request.POST),
-        )
+        try:
+            # If no existing client selected, create a new one if data provided
+            if not data["client_id"] and request.POST.get("new_client_name") and request.POST.get("new_client_company"):
+                client = services.create_client({
+                    field: request.POST.get(f"new_client_{field}", "") for field in services.CLIENT_FIELDS
+                } | {"full_name": request.POST.get("new_client_name")}, request.tenant)
+                data["client_id"] = client.id
+
+            # Create the quote record with service and format options
+            quote = services.create_quote(data, request.tenant)
+        except services.ServiceError as exc:
+            messages.error(request, str(exc))
+            return redirect("quote_form")
 
         messages.success(request, "Cotización creada correctamente.")
         return redirect("quote_details", quote_id=quote.id)
@@ -107,212 +69,129 @@ def quote_form(request):
     return render(request, "quotes/quote_form.html", {"clients": clients})
 
 
-# View: manage quote details and generate the final Word (.docx) report
-def quote_details(request, quote_id):
-    quote = get_object_or_404(Quote, id=quote_id)
+# Conditional GET support: version stamps of a quote page / document.
+# Only reads timestamps and flags, so a 304 costs one small query and no rendering.
+QUOTE_TEMPLATE_FIELDS = ("is_detection", "is_protection", "is_human_safety", "deliver_autocad", "deliver_revit")
 
-    # Load all available reference norms for display
-    norms = Norm.objects.all().order_by("code")
 
-    # Parse text inputs into structured lists
-    if request.method == "POST":
-        client_requirements = parse_items(request.POST.get("manual_requirements", ""))
-        items_human_safety = parse_items(request.POST.get("manual_items_sh", ""))
-        items_protection = parse_items(request.POST.get("manual_items_protection", ""))
-        items_detection = parse_items(request.POST.get("manual_items_detection", ""))
+def quote_stamps(request, quote_id):
+    # Memoized per request: the ETag and Last-Modified functions both need it
+    if not hasattr(request, "_quote_stamps"):
+        row = Quote.objects.for_tenant(request.tenant).filter(id=quote_id).values_list(
+            "updated_at", "client__updated_at", *QUOTE_TEMPLATE_FIELDS
+        ).first()
+        if row is None:
+            request._quote_stamps = None
+        else:
+            quote_modified, client_modified, *flags = row
+            norms_version, norms_modified = catalog_version(request.tenant.id)
+            last_modified = max(d for d in (quote_modified, client_modified, norms_modified) if d is not None)
+            version = f"{quote_id}:{quote_modified.timestamp()}:{client_modified.timestamp()}:{norms_version}"
+            request._quote_stamps = (version, last_modified, services.get_template_filename(*flags))
+    return request._quote_stamps
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1(":".join(str(p) for p in parts).encode()).hexdigest()
 
-        notes_count = int(request.POST.get("notes_count", 0))
-        additional_notes = [
-            request.POST.get(f"note_{i}", "").strip()
-            for i in range(1, notes_count + 1)
-            if request.POST.get(f"note_{i}", "").strip()
-        ]
-
-        payment_advance = request.POST.get("payment_advance", "")
-        payment_first_version = request.POST.get("payment_first_version", "")
-        payment_final = request.POST.get("payment_final", "")
-        delivery_time_value = request.POST.get("delivery_time_value", "")
-        delivery_time_unit = request.POST.get("delivery_time_unit", "")
-
-        # Normalize checkbox input (HTML sends "on"/"true"/None inconsistently)
-        def str2bool(v):
-            return str(v).lower() in ("true", "1", "yes", "on")
-
-        quote.is_detection = str2bool(request.POST.get("is_detection", quote.is_detection))
-        quote.is_protection = str2bool(request.POST.get("is_protection", quote.is_protection))
-        quote.is_human_safety = str2bool(request.POST.get("is_human_safety", quote.is_human_safety))
-        quote.deliver_autocad = str2bool(request.POST.get("deliver_autocad", quote.deliver_autocad))
-        quote.deliver_revit = str2bool(request.POST.get("deliver_revit", quote.deliver_revit))
-
-        quote.payment_advance = int(payment_advance) if str(payment_advance).isdigit() else quote.payment_advance
-        quote.payment_first_version = int(payment_first_version) if str(
-            payment_first_version).isdigit() else quote.payment_first_version
-        quote.payment_final = int(payment_final) if str(payment_final).isdigit() else quote.payment_final
-        quote.delivery_time_value = int(delivery_time_value) if str(
-            delivery_time_value).isdigit() else quote.delivery_time_value
-        quote.delivery_time_unit = delivery_time_unit or quote.delivery_time_unit
-        quote.save()
-
-        # Select the appropriate Word template based on chosen options
-        template_filename = get_template_filename(
-            is_detection=quote.is_detection,
-            is_protection=quote.is_protection,
-            is_human_safety=quote.is_human_safety,
-            deliver_autocad=quote.deliver_autocad,
-            deliver_revit=quote.deliver_revit,
-        )
-
-        # Handle default vs. user-selected reference norms
-        posted_norm_ids = request.POST.getlist("selected_norms")  # viene como lista de strings
-        # Safely convert submitted IDs to integers
-        try:
-            posted_norm_ids = [int(i) for i in posted_norm_ids if i and str(i).isdigit()]
-        except ValueError:
-            posted_norm_ids = []
 
-        if posted_norm_ids:
-            # Use user-selected norms if any were checked
-            selected_norms_qs = Norm.objects.filter(id__in=posted_norm_ids)
+def quote_details_etag(request, quote_id):
+    stamps = quote_stamps(request, quote_id)
+    # Pending flash messages are rendered into the page: never answer 304 then
+    if stamps is None or request.COOKIES.get("messages"):
+        return None
+    # The page embeds the CSRF token, so it is only valid for the same CSRF cookie
+    return make_etag("details", stamps[0], request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""))
+
+
+def document_stamps(request, quote_id):
+    # (ETag, Last-Modified) of the document quote_download would serve; memoized per request
+    if not hasattr(request, "_document_stamps"):
+        stamps = quote_stamps(request, quote_id)
+        if stamps is None or stamps[2] is None:
+            request._document_stamps = None
+            return None
+
+        template_path, _ = services.template_source(request.tenant, stamps[2])
+        template_modified = services.file_modified(template_path)
+        sources_modified = max(d for d in (stamps[1], template_modified) if d is not None)
+
+        document = archive.current_document(quote_id, sources_modified, fields=("digest", "created_at"))
+        if document is not None:
+            # The archived copy is served (reassembled, hence a weak ETag)
+            request._document_stamps = (f'W/"{document.digest}"', document.created_at)
         else:
-            # Otherwise, fall back to default norms
-            selected_norms_qs = Norm.objects.filter(is_default=True)
-
-        # Replace previous norms assigned to this quote
-        quote.norms.set(selected_norms_qs)
-        quote.save()
-
-        # Select the appropriate Word (.docx) template
-        template_filename = get_template_filename(
-            is_detection=quote.is_detection,
-            is_protection=quote.is_protection,
-            is_human_safety=quote.is_human_safety,
-            deliver_autocad=quote.deliver_autocad,
-            deliver_revit=quote.deliver_revit
-        )
-
-        # Validate that a template exists before rendering
-        if not template_filename:
-            messages.error(
-                request,
-                "No se seleccionó ningún servicio, por favor marca al menos uno."
-            )
-            return redirect("quote_form")
+            # Regenerated on download: the document is dated, so it changes every day
+            today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+            etag = make_etag("document", stamps[0], stamps[2], template_modified, date.today().isoformat())
+            request._document_stamps = (etag, max(sources_modified, today))
+    return request._document_stamps
 
-        template_path = os.path.join(settings.BASE_DIR, "quotes", "templates_docs", template_filename)
 
-        if not os.path.exists(template_path):
-            messages.error(
-                request,
-                f"No se encontró la plantilla correspondiente: {template_filename}"
-            )
-            return redirect("quote_form")
+def quote_document_etag(request, quote_id):
+    stamps = document_stamps(request, quote_id)
+    return stamps[0] if stamps else None
 
-        import locale
-        from datetime import datetime
 
-        # Helpers: format bullet-point text for correct Word rendering
-        def format_bullets(items, bullet="-"):
-            # Format a list of items as bullet points with a tab after the bullet. Example: "-\tItem text"
-            if not items:
-                return ""
-            return "\n".join(f"{bullet}\t{i.strip()}" for i in items if i and str(i).strip())
+def quote_last_modified(request, quote_id):
+    stamps = quote_stamps(request, quote_id)
+    if stamps is None or request.COOKIES.get("messages"):
+        return None
+    return stamps[1]
 
-        def format_bullets_no_tab(items, bullet='-'):
-            # Format a list of items as bullet points without a tab character.
-            if not items:
-                return ""
-            return "\n".join(f"{bullet} {i.strip()}" for i in items if i and str(i).strip())
 
-        # Format date in Spanish (fallback for Windows locale issues)
-        try:
-            locale.setlocale(locale.LC_TIME, "es_ES.UTF-8")
-        except locale.Error:
-            try:
-                locale.setlocale(locale.LC_TIME, "Spanish_Spain")
-            except locale.Error:
-                meses_es = {
-                    "January": "enero", "February": "febrero", "March": "marzo", "April": "abril",
-                    "May": "mayo", "June": "junio", "July": "julio", "August": "agosto",
-                    "September": "septiembre", "October": "octubre", "November": "noviembre", "December": "diciembre"
-                }
-                fecha_en = datetime.now().strftime("%d de %B de %Y")
-                for en, es in meses_es.items():
-                    fecha_en = fecha_en.replace(en, es)
-                quote_date_es = fecha_en
-            else:
-                quote_date_es = datetime.now().strftime("%d de %B de %Y")
-        else:
-            quote_date_es = datetime.now().strftime("%d de %B de %Y")
+def quote_document_last_modified(request, quote_id):
+    stamps = document_stamps(request, quote_id)
+    return stamps[1] if stamps else None
 
-        # Build formatted list of reference norms
-        reference_norms = [f"{n.code} {n.description}".strip() for n in quote.norms.all()]
 
-        # Get display title (Mr./Mrs.) from client model
-        if hasattr(quote.client, "get_title_display"):
-            client_title = quote.client.get_title_display()
-        else:
-            client_title = getattr(quote.client, "title", "") or ""
-
-        # Context data for the Word template
-        context = {
-            "quote_date": quote_date_es,
-            "quote_number": f"COT{quote.id:03d}-25",
-
-            "client_city": getattr(quote.client, "city", "") or "",
-            "client_company": getattr(quote.client, "company", "") or "",
-            "client_title": client_title,
-            "client_name": quote.client.full_name,
-            "client_position": getattr(quote.client, "position", "") or "",
-
-            "project_name": quote.project_name,
-
-            "reference_norms": format_bullets(reference_norms, bullet="•"),  # ← punto
-            "client_requirements": format_bullets(client_requirements),  # ← guion
-            "items_human_safety": format_bullets(items_human_safety),
-            "items_protection": format_bullets(items_protection),
-            "items_detection": format_bullets(items_detection),
-            "additional_notes": format_bullets_no_tab(additional_notes, "-"),
-            "payment_schedule": format_bullets_no_tab([
-                f"{quote.payment_advance}% Anticipo",
-                f"{quote.payment_first_version}% Contra entrega de la primera versión del diseño",
-                f"{quote.payment_final}% Contra entrega final del diseño",
-            ], "-"),
-
-            "delivery_time_text": f"{quote.delivery_time_value} {quote.get_delivery_time_unit_display()} a partir del pago del anticipo.",
-
-            "value_protection": getattr(quote, "value_protection", ""),
-            "value_detection": getattr(quote, "value_detection", ""),
-            "value_human_safety": getattr(quote, "value_human_safety", ""),
-            "total_value": getattr(quote, "total_value", ""),
-            "total_value_text": getattr(quote, "total_value_text", ""),
+# View: manage quote details and generate the final Word (.docx) report
+@condition(etag_func=quote_details_etag, last_modified_func=quote_last_modified)
+def quote_details(request, quote_id):
+    quote = get_object_or_404(Quote.objects.for_tenant(request.tenant), id=quote_id)
+
+    # Parse text inputs into structured lists
+    if request.method == "POST":
+        notes_count = int(request.POST.get("notes_count", 0))
+        details = {
+            "client_requirements": request.POST.get("manual_requirements", ""),
+            "items_human_safety": request.POST.get("manual_items_sh", ""),
+            "items_protection": request.POST.get("manual_items_protection", ""),
+            "items_detection": request.POST.get("manual_items_detection", ""),
+            "additional_notes": [request.POST.get(f"note_{i}", "") for i in range(1, notes_count + 1)],
+            "payment_advance": request.POST.get("payment_advance", ""),
+            "payment_first_version": request.POST.get("payment_first_version", ""),
+            "payment_final": request.POST.get("payment_final", ""),
+            "delivery_time_value": request.POST.get("delivery_time_value", ""),
+            "delivery_time_unit": request.POST.get("delivery_time_unit", ""),
         }
+        for flag in services.SERVICE_FLAGS:
+            if flag in request.POST:
+                details[flag] = request.POST[flag]
 
-        doc = DocxTemplate(template_path)
-        doc.render(context)
-
-        # Save the generated .docx file to the output directory
-        safe_client_name = "".join(c for c in quote.client.full_name if c.isalnum() or c in (" ", "_")).strip().replace(" ", "_")
-        safe_project = "".join(c for c in quote.project_name if c.isalnum() or c in (" ", "_")).strip().replace(" ", "_")
-        output_filename = f"Cotizacion_{safe_client_name}_{safe_project}.docx"
-        os.makedirs(os.path.join(settings.BASE_DIR, "generated_docs"), exist_ok=True)
-        output_path = os.path.join(settings.BASE_DIR, "generated_docs", output_filename)
-        doc.save(output_path)
-
-        # Return the generated file as a downloadable response
-        with open(output_path, "rb") as f:
-            response = HttpResponse(
-                f.read(),
-                content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            )
-            response["Content-Disposition"] = f'attachment; filename="{output_filename}"'
-            return response
+        # Persist the details and the user-selected (or default) reference norms
+        try:
+            services.update_quote_details(quote, details, request.POST.getlist("selected_norms"))
+        except services.ServiceError as exc:
+            messages.error(request, str(exc))
+            return redirect("quote_details", quote_id=quote.id)
+
+        try:
+            output_filename, content = services.generate_document(quote)
+        except services.ServiceError as exc:
+            messages.error(request, str(exc))
+            return redirect("quote_form")
+
+        return document_response(output_filename, content)
 
     # On GET: render quote detail page with all norms and notes
     notes_range = range(1, 11)
-    # Pass all norms to the template and mark the selected or default ones as checked
+    # Pass all norms (kept in memory, see norm_catalog.py) to the template and
+    # mark the selected or default ones as checked
+    norms = get_norms(request.tenant.id)
     selected_norm_ids = set(quote.norms.values_list('id', flat=True))
-    default_norm_ids = set(Norm.objects.filter(is_default=True).values_list('id', flat=True))
-    return render(
+    default_norm_ids = {norm.id for norm in norms if norm.is_default}
+    response = render(
         request,
         "quotes/quote_details.html",
         {
@@ -323,3 +202,38 @@ def quote_details(request, quote_id):
             "default_norm_ids": default_norm_ids,
         },
     )
+    # Per-browser page (CSRF token): let the browser keep it but revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# View: download the document of a quote (archived copy, or regenerated from its stored data)
+@require_safe
+@condition(etag_func=quote_document_etag, last_modified_func=quote_document_last_modified)
+def quote_download(request, quote_id):
+    quote = get_object_or_404(Quote.objects.for_tenant(request.tenant).select_related("client"), id=quote_id)
+    try:
+        output_filename, content = services.get_document(quote)
+    except services.ServiceError as exc:
+        messages.error(request, str(exc))
+        return redirect("quote_details", quote_id=quote.id)
+
+    response = document_response(output_filename, content)
+    # Caches may keep the document but must revalidate it (cheap 304 when unchanged)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+# View: frequency-ranked suggestions for the manual item textareas (served from memory)
+def item_suggestions(request):
+    section = request.GET.get("section", "")
+    prefix = request.GET.get("q", "")
+    return JsonResponse({"suggestions": item_library.suggest(request.tenant.id, section, prefix)})
+
+
+# View: full-text search over the generated quote documents
+@require_safe
+def quote_search(request):
+    query = request.GET.get("q", "").strip()
+    results = search.search_quotes(request.tenant, query) if query else []
+    return render(request, "quotes/quote_search.html", {"query": query, "results": results})